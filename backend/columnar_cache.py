@@ -0,0 +1,135 @@
+import os
+import traceback
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import db
+
+# Local columnar copies of one account's oura_trends rows, written by the
+# dashboard after each load/refresh in the projected columns and compact dtypes
+# it serves. Files are uncompressed Arrow IPC so readers can memory-map them: the
+# OS page cache is shared by every process reading the same file, and columns
+# Arrow can hand over without conversion stay backed by the map.
+CACHE_DIR = os.environ.get(
+    "COLUMNAR_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "cache"),
+)
+
+# Table -> (logical database, query returning one account's (row count, newest
+# updated_at, sum of updated_at in microseconds)). The sum moves whenever any row
+# is rewritten, even by a transaction that commits below the newest updated_at.
+# The triple is stored with the file and compared against the database on load.
+VERSION_QUERIES = {
+    "oura_trends": ("oura", """
+        SELECT count(*), max(updated_at), sum((extract(epoch FROM updated_at) * 1000000)::bigint)
+        FROM oura_trends WHERE account_id = %s
+    """),
+}
+VERSION_KEY = b"cache_version"
+
+# Nullable integers come back as pandas masked arrays (the values buffer stays
+# in the map) instead of float64 copies
+_PANDAS_TYPES = {
+    pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+}
+
+
+def cache_path(name, account):
+    return os.path.join(CACHE_DIR, f"{name}.{account}.arrow")
+
+
+def _version_string(count, marker, checksum):
+    if marker is None or pd.isna(marker):
+        marker = None
+    elif hasattr(marker, "isoformat"):
+        # Same text whether the timestamp came from psycopg2 or a DataFrame
+        marker = pd.Timestamp(marker)
+        marker = (marker.tz_convert("UTC") if marker.tzinfo else marker).isoformat()
+    return f"{count}:{marker}:{int(checksum or 0)}"
+
+
+def db_version(name, account):
+    database, sql = VERSION_QUERIES[name]
+    try:
+        with db.connection(database) as conn, conn.cursor() as cur:
+            cur.execute(sql, (account,))
+            return _version_string(*cur.fetchone())
+    except Exception:
+        traceback.print_exc()
+        return None
+
+
+def frame_version(df, marker="updated_at"):
+    # The version db_version() returns for the rows in df
+    if marker not in df.columns or df.empty:
+        return _version_string(len(df), None, None)
+    return _version_string(len(df), df[marker].max(), updated_checksum(df[marker]))
+
+
+def updated_checksum(values):
+    # Python ints, so the sum is exact like PostgreSQL's numeric sum
+    micros = pd.to_datetime(values, utc=True).dropna().dt.as_unit("us").astype("int64")
+    return sum(micros.tolist())
+
+
+def write(name, account, df, version=None):
+    # Write-then-rename so readers never map a half-written file; the temp name is
+    # per process since every dashboard worker may write the same cache
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    version = frame_version(df) if version is None else version
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_KEY: str(version).encode()})
+    path = cache_path(name, account)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_table(name, account, columns=None):
+    # Zero-copy: the returned table's buffers point into the memory map
+    path = cache_path(name, account)
+    if not os.path.exists(path):
+        return None, None
+    source = pa.memory_map(path, "r")
+    table = ipc.open_file(source).read_all()
+    version = (table.schema.metadata or {}).get(VERSION_KEY, b"").decode() or None
+    if columns is not None:
+        table = table.select([col for col in columns if col in table.column_names])
+    return table, version
+
+
+def load(name, account, columns=None, expected_version=None):
+    # DataFrame from the cache, or None when it is missing, unreadable or (if
+    # expected_version is given) doesn't match the database
+    try:
+        table, version = read_table(name, account, columns)
+    except Exception:
+        traceback.print_exc()
+        return None
+    if table is None or (expected_version is not None and version != expected_version):
+        return None
+    return table.to_pandas(split_blocks=True, date_as_object=False, coerce_temporal_nanoseconds=True,
+                           types_mapper=_PANDAS_TYPES.get)
+
+
+def load_current(name, account, columns=None):
+    # Fast-start read: the cache only when its version matches the database,
+    # None otherwise (including when the database can't be asked)
+    version = db_version(name, account)
+    if version is None:
+        return None
+    return load(name, account, columns, expected_version=version)
+
+
+def save(name, account, df):
+    # Best effort: a failed write only costs the next start a SQL load
+    try:
+        return write(name, account, df)
+    except Exception:
+        traceback.print_exc()
+        return None
@@ -0,0 +1,166 @@
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+from psycopg2.extensions import cursor as _cursor
+from psycopg2.pool import ThreadedConnectionPool
+
+import metrics
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+# Logical databases and their defaults. Every setting can be overridden from the
+# environment as <PREFIX>_NAME / _USER / _PASSWORD / _HOST / _PORT.
+DATABASES = {
+    "oura": ("OURA_DB", dict(dbname="oura_data", user="postgres", password="password",
+                             host="localhost", port="5432")),
+    "fitness": ("FITNESS_DB", dict(dbname="fitness_coach", user="fitness_user", password="fitness_user",
+                                   host="localhost", port="5432")),
+}
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+COPY_CHUNK_ROWS = 100_000
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def db_settings(name):
+    prefix, defaults = DATABASES[name]
+    keys = {"dbname": "NAME", "user": "USER", "password": "PASSWORD", "host": "HOST", "port": "PORT"}
+    return {key: os.environ.get(f"{prefix}_{suffix}", defaults[key]) for key, suffix in keys.items()}
+
+
+class TimedCursor(_cursor):
+    # Every statement on a pooled connection feeds metrics.db_query_seconds / db_rows_total
+    def _observe(self, sql, started):
+        seconds = time.perf_counter() - started
+        # Runs in a finally block: it must never mask the statement's own error
+        try:
+            if hasattr(sql, "as_string"):
+                sql = sql.as_string(self.connection)
+            metrics.observe_query(self.connection.info.dbname, sql, seconds, self.rowcount)
+        except Exception:
+            pass
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._observe(query, started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._observe(sql, started)
+
+
+class _Pool:
+    # ThreadedConnectionPool raises as soon as it is exhausted; the semaphore makes
+    # callers wait for a free connection instead, and the counters feed pool_stats()
+    def __init__(self, name):
+        self.name = name
+        self.pool = ThreadedConnectionPool(POOL_MIN, POOL_MAX, cursor_factory=TimedCursor, **db_settings(name))
+        self.slots = threading.BoundedSemaphore(POOL_MAX)
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.discarded = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "max_size": POOL_MAX,
+                "open": len(self.pool._pool) + len(self.pool._used),
+                "in_use": self.in_use,
+                "idle": len(self.pool._pool),
+                "checkouts": self.checkouts,
+                "avg_wait_ms": 1000 * self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+                "discarded": self.discarded,
+            }
+
+
+def get_pool(name="oura"):
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = _Pool(name)
+        return _pools[name]
+
+
+@contextmanager
+def connection(name="oura"):
+    # Borrow a pooled connection; commits on success, rolls back on error
+    pool = get_pool(name)
+    started = time.perf_counter()
+    pool.slots.acquire()
+    conn = None
+    try:
+        conn = pool.pool.getconn()
+        if conn.closed:
+            pool.pool.putconn(conn, close=True)
+            conn = pool.pool.getconn()
+        with pool.lock:
+            pool.in_use += 1
+            pool.checkouts += 1
+            pool.wait_seconds += time.perf_counter() - started
+
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            with pool.lock:
+                pool.in_use -= 1
+    finally:
+        if conn is not None:
+            broken = bool(conn.closed)
+            if broken:
+                with pool.lock:
+                    pool.discarded += 1
+            pool.pool.putconn(conn, close=broken)
+        pool.slots.release()
+
+
+def read_frame(sql, params=None, db="oura"):
+    with connection(db) as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def copy_frame(cur, df, table, columns=None, chunk_rows=COPY_CHUNK_ROWS):
+    # Streams df into table with COPY FROM STDIN in chunk_rows-sized CSV pieces
+    columns = list(columns or df.columns)
+    frame = df[columns]
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    for start in range(0, len(frame), chunk_rows):
+        buf = io.StringIO()
+        frame.iloc[start:start + chunk_rows].to_csv(buf, index=False, header=False, na_rep="")
+        buf.seek(0)
+        cur.copy_expert(sql, buf)
+    return len(df)
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = dict(_pools)
+    return {name: pool.stats() for name, pool in pools.items()}
+
+
+def close_all():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.pool.closeall()
+        _pools.clear()
@@ -0,0 +1,226 @@
+import queue
+import threading
+import zlib
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from psycopg2 import sql
+
+import db
+from migrations import DEFAULT_ACCOUNT
+
+# Tables that can be exported: name -> (logical database, date column or None,
+# account to keep or None). oura_trends holds every synced ring; the dashboard's
+# export only serves its own OURA_ACCOUNT.
+EXPORTS = {
+    "TrainingData": ("fitness", None, None),
+    "oura_trends": ("oura", "date", DEFAULT_ACCOUNT),
+}
+FORMATS = ("csv", "parquet")
+CHUNK_BYTES = 1 << 20
+QUEUE_CHUNKS = 8
+PARQUET_BATCH_ROWS = 50_000
+
+# PostgreSQL type OID -> Arrow type for Parquet output; anything else goes out as text
+ARROW_TYPES = {
+    16: pa.bool_(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(),
+    700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+    1082: pa.date32(), 1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+}
+
+_DONE = object()
+
+
+class ExportError(ValueError):
+    pass
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _Pipe:
+    # File-like sink for the producer thread. Writes are grouped into CHUNK_BYTES
+    # pieces on a bounded queue, so a slow client pauses the database read
+    # instead of the export piling up in memory.
+    closed = False
+
+    def __init__(self):
+        self.queue = queue.Queue(QUEUE_CHUNKS)
+        self.cancelled = threading.Event()
+        self._parts = []
+        self._size = 0
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        data = bytes(data)
+        self._parts.append(data)
+        self._size += len(data)
+        self._position += len(data)
+        if self._size >= CHUNK_BYTES:
+            self._put(b"".join(self._parts))
+            self._parts, self._size = [], 0
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def _put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise _Cancelled()
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self, error=None):
+        try:
+            if error is None and self._parts:
+                self._put(b"".join(self._parts))
+            self._put(_DONE if error is None else error)
+        except _Cancelled:
+            pass
+
+
+def parse_request(table, fmt="csv", columns=None, start=None, end=None):
+    # Validates the export parameters before any bytes are sent, so a bad request
+    # still gets a proper error response. Returns (database, query).
+    if table not in EXPORTS:
+        raise ExportError(f"Unknown table {table!r}; choose from {', '.join(EXPORTS)}")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    database, date_column, account = EXPORTS[table]
+
+    with db.connection(database) as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position
+        """, (table.lower(),))
+        available = [row[0] for row in cur.fetchall()]
+    if columns:
+        unknown = [col for col in columns if col not in available]
+        if unknown:
+            raise ExportError(f"Unknown columns for {table}: {', '.join(unknown)}")
+    else:
+        columns = available
+
+    conditions = []
+    # Tables migrated before accounts existed have no account_id and hold one account
+    if account is not None and "account_id" in available:
+        conditions.append(sql.SQL("account_id = {}").format(sql.Literal(account)))
+    for value, op in ((start, ">="), (end, "<=")):
+        if value is None:
+            continue
+        if date_column is None:
+            raise ExportError(f"{table} has no date column to filter on")
+        try:
+            value = date.fromisoformat(value)
+        except ValueError:
+            raise ExportError(f"Dates must be YYYY-MM-DD, got {value!r}")
+        conditions.append(sql.SQL("{} " + op + " {}").format(sql.Identifier(date_column), sql.Literal(value)))
+
+    query = sql.SQL("SELECT {} FROM {}").format(
+        sql.SQL(", ").join(map(sql.Identifier, columns)), sql.Identifier(table.lower()))
+    if conditions:
+        query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+    if date_column is not None:
+        query += sql.SQL(" ORDER BY {}").format(sql.Identifier(date_column))
+    return database, query
+
+
+def _copy_csv(database, query):
+    def produce(pipe):
+        with db.connection(database) as conn, conn.cursor() as cur:
+            copy = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)").format(query)
+            cur.copy_expert(copy.as_string(conn), pipe)
+    return produce
+
+
+def _arrow_column(values, type_code):
+    arrow_type = ARROW_TYPES.get(type_code)
+    if arrow_type is None:
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    if type_code == 1700:
+        values = [None if v is None else float(v) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def _copy_parquet(database, query, compression):
+    def produce(pipe):
+        with db.connection(database) as conn:
+            # Named (server-side) cursor: rows arrive PARQUET_BATCH_ROWS at a time
+            with conn.cursor(name="export") as cur:
+                cur.itersize = PARQUET_BATCH_ROWS
+                cur.execute(query)
+                writer = None
+                while True:
+                    rows = cur.fetchmany(PARQUET_BATCH_ROWS)
+                    if writer is None:
+                        names = [desc[0] for desc in cur.description]
+                        types = [desc[1] for desc in cur.description]
+                    columns = list(zip(*rows)) if rows else [[] for _ in names]
+                    batch = pa.table([_arrow_column(col, t) for col, t in zip(columns, types)], names=names)
+                    if writer is None:
+                        writer = pq.ParquetWriter(pipe, batch.schema, compression=compression)
+                    if rows:
+                        writer.write_table(batch)
+                    if len(rows) < PARQUET_BATCH_ROWS:
+                        break
+                writer.close()
+    return produce
+
+
+def stream(produce, gzip=False):
+    # Runs produce(pipe) on a worker thread and yields its output as it arrives.
+    # Closing the generator (client went away) cancels the producer.
+    pipe = _Pipe()
+
+    def run():
+        try:
+            produce(pipe)
+        except _Cancelled:
+            return
+        except Exception as e:
+            pipe.finish(e)
+            return
+        pipe.finish()
+
+    threading.Thread(target=run, daemon=True).start()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    try:
+        while True:
+            item = pipe.queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            chunk = compressor.compress(item) if compressor else item
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        pipe.cancelled.set()
+
+
+def export(table, fmt="csv", columns=None, start=None, end=None, gzip=False):
+    # (byte iterator, mimetype, filename). CSV is COPY ... TO STDOUT, optionally
+    # gzipped on the fly; Parquet uses gzip as its column codec instead.
+    database, query = parse_request(table, fmt, columns, start, end)
+    if fmt == "parquet":
+        produce = _copy_parquet(database, query, "gzip" if gzip else "snappy")
+        return stream(produce), "application/vnd.apache.parquet", f"{table}.parquet"
+    if gzip:
+        return stream(_copy_csv(database, query), gzip=True), "application/gzip", f"{table}.csv.gz"
+    return stream(_copy_csv(database, query)), "text/csv", f"{table}.csv"
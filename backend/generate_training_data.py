@@ -1,38 +1,127 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-import random
-
-# Step 1: Load CSV
-df = pd.read_csv(r"R:\fitness_recommender\archive\mturkfitbit_export_4.12.16-5.12.16\Fitabase Data 4.12.16-5.12.16\dailyActivity_merged.csv")
-
-# Step 2: Extract relevant columns
-training_df = pd.DataFrame()
-training_df["steps"] = df["TotalSteps"]
-training_df["sleep_hours"] = df["TotalMinutesAsleep"] / 60
-
-# Step 3: Simulate heart rate (between 65-130 bpm)
-training_df["heart_rate"] = [random.randint(65, 130) for _ in range(len(df))]
-
-# Step 4: Simulate stress level (1 = low, 5 = high)
-training_df["stress_level"] = [random.randint(1, 5) for _ in range(len(df))]
-
-# Step 5: (Optional) Simulate previous workout
-training_df["previous_workout"] = random.choices(
-    ["Cardio", "Strength", "Rest", "Yoga", "Walk"], k=len(df)
-)
-
-# Step 6: Create recommended workout logic
-def recommend(row):
-    if row["stress_level"] >= 4 or row["sleep_hours"] < 6:
-        return "Rest"
-    elif row["steps"] > 8000 and row["heart_rate"] < 90:
-        return "Cardio"
-    elif row["heart_rate"] > 100:
-        return "Yoga"
+
+DEFAULT_GLOB = r"R:\fitness_recommender\archive\**\dailyActivity_merged.csv"
+DEFAULT_OUT_DIR = r"R:\fitness_recommender\data"
+WORKOUTS = ["Cardio", "Strength", "Rest", "Yoga", "Walk"]
+SHARD_ROWS = 1_000_000
+COLUMNS = ["steps", "sleep_hours", "heart_rate", "stress_level", "previous_workout", "recommended_workout"]
+
+
+def read_source(path):
+    # Only the two columns we use; TotalMinutesAsleep is missing from some exports
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [col for col in ("TotalSteps", "TotalMinutesAsleep") if col in header]
+    df = pd.read_csv(path, usecols=usecols)
+    steps = df["TotalSteps"].to_numpy(np.int64)
+    if "TotalMinutesAsleep" in df:
+        sleep_hours = df["TotalMinutesAsleep"].to_numpy(np.float64) / 60
     else:
-        return "Strength"
+        sleep_hours = np.full(len(df), np.nan)
+    return steps, sleep_hours
+
+
+def recommend(steps, heart_rate, sleep_hours, stress_level):
+    # Same rules as before, evaluated over whole columns; the first matching
+    # condition wins, like the old if/elif chain
+    conditions = [
+        (stress_level >= 4) | (sleep_hours < 6),
+        (steps > 8000) & (heart_rate < 90),
+        heart_rate > 100,
+    ]
+    return np.select(conditions, ["Rest", "Cardio", "Yoga"], default="Strength")
+
+
+def generate(steps, sleep_hours, rng, n_rows=None):
+    # Simulated columns for n_rows rows. With n_rows set, source days are drawn
+    # with replacement so one export can be scaled up to any size.
+    if n_rows is not None:
+        picked = rng.integers(0, len(steps), size=n_rows)
+        steps, sleep_hours = steps[picked], sleep_hours[picked]
+    n = len(steps)
+
+    # Step 1: Simulate heart rate (between 65-130 bpm)
+    heart_rate = rng.integers(65, 131, size=n)
+
+    # Step 2: Simulate stress level (1 = low, 5 = high)
+    stress_level = rng.integers(1, 6, size=n)
+
+    # Step 3: Simulate previous workout
+    previous_workout = np.asarray(WORKOUTS)[rng.integers(0, len(WORKOUTS), size=n)]
+
+    # Step 4: Recommended workout
+    recommended = recommend(steps, heart_rate, sleep_hours, stress_level)
+
+    return pd.DataFrame({
+        "steps": steps,
+        "sleep_hours": sleep_hours,
+        "heart_rate": heart_rate,
+        "stress_level": stress_level,
+        "previous_workout": previous_workout,
+        "recommended_workout": recommended,
+    }, columns=COLUMNS)
+
+
+def write_shard(task):
+    # One unit of work for the pool: a shard built from one source export
+    path, out_path, n_rows, seed = task
+    steps, sleep_hours = read_source(path)
+    df = generate(steps, sleep_hours, np.random.default_rng(seed), n_rows)
+    df.to_csv(out_path, index=False)
+    return out_path, len(df)
+
+
+def plan_shards(files, out_dir, rows=None, shard_rows=SHARD_ROWS, seed=42):
+    # Without rows every export is converted once, day for day; with rows the
+    # total is split evenly across exports. Each shard gets its own child seed,
+    # so the output doesn't depend on how many workers run it.
+    tasks = []
+    for i, path in enumerate(files):
+        if rows is None:
+            tasks.append((path, None))
+            continue
+        share = rows // len(files) + (1 if i < rows % len(files) else 0)
+        for start in range(0, share, shard_rows):
+            tasks.append((path, min(shard_rows, share - start)))
+
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    return [
+        (path, os.path.join(out_dir, f"TrainingData-{n:04d}.csv"), n_rows, child)
+        for n, ((path, n_rows), child) in enumerate(zip(tasks, seeds))
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate TrainingData CSV shards from Fitabase exports")
+    parser.add_argument("--glob", default=DEFAULT_GLOB, help="Fitabase dailyActivity files to read (recursive)")
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--rows", type=int, help="Total rows to generate (default: one per source day)")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # Step 1: Find every export
+    files = sorted(glob.glob(args.glob, recursive=True))
+    if not files:
+        raise SystemExit(f"⚠️ No files match {args.glob}")
+    os.makedirs(args.out_dir, exist_ok=True)
 
-training_df["recommended_workout"] = training_df.apply(recommend, axis=1)
+    # Step 2: Generate shards across a process pool
+    started = time.perf_counter()
+    tasks = plan_shards(files, args.out_dir, args.rows, args.shard_rows, args.seed)
+    total = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for out_path, n in pool.map(write_shard, tasks):
+            total += n
+            print(f"   {os.path.basename(out_path)}: {n:,} rows")
 
-# Step 7: Save as CSV
-training_df.to_csv(r"R:\fitness_recommender\data\TrainingData.csv", index=False)
-print("✅ TrainingData.csv created successfully!")
+    elapsed = time.perf_counter() - started
+    print(f"✅ {total:,} rows from {len(files)} file(s) in {len(tasks)} shard(s) "
+          f"({elapsed:.1f}s, {total / elapsed:,.0f} rows/s) -> {args.out_dir}")
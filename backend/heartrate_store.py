@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+import db
+
+# Intraday heart rate, stored one row per (account_id, day) with the samples
+# packed into bytea columns: offsets as little-endian int32 seconds since 00:00
+# UTC, bpm and source as uint8. At ~300 samples a day this keeps the row count
+# equal to the daily tables while PostgreSQL's TOAST compression handles the
+# bulk, and reads turn each day into NumPy arrays with np.frombuffer instead of
+# building a Python object per sample.
+TABLE = "oura_heartrate"
+OFFSET_DTYPE = np.dtype("<i4")
+SOURCES = ["awake", "rest", "sleep", "session", "live", "workout"]
+UNKNOWN_SOURCE = 255
+
+
+def samples_from_docs(docs):
+    # API documents -> (timestamps as datetime64[s] UTC, bpm uint8, source uint8)
+    if not docs:
+        return np.array([], dtype="datetime64[s]"), np.array([], np.uint8), np.array([], np.uint8)
+    df = pd.DataFrame(docs)
+    ts = pd.to_datetime(df["timestamp"], utc=True).dt.tz_localize(None).to_numpy("datetime64[s]")
+    bpm = pd.to_numeric(df["bpm"], errors="coerce").clip(0, 254).fillna(0).to_numpy(np.uint8)
+    codes = {name: i for i, name in enumerate(SOURCES)}
+    source = df["source"].map(codes).fillna(UNKNOWN_SOURCE).to_numpy(np.uint8) if "source" in df else \
+        np.full(len(df), UNKNOWN_SOURCE, np.uint8)
+    return ts, bpm, source
+
+
+def _unpack(day, offsets, bpm, source):
+    base = np.datetime64(day, "s")
+    return (base + np.frombuffer(offsets, OFFSET_DTYPE).astype("timedelta64[s]"),
+            np.frombuffer(bpm, np.uint8), np.frombuffer(source, np.uint8))
+
+
+def _concat(parts):
+    if not parts:
+        return np.array([], dtype="datetime64[s]"), np.array([], np.uint8), np.array([], np.uint8)
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def _read_days(cur, account_id, first, last):
+    cur.execute(f"""
+        SELECT day, offsets, bpm, source FROM {TABLE}
+        WHERE account_id = %s AND day BETWEEN %s AND %s
+        ORDER BY day
+    """, (account_id, first, last))
+    return _concat([_unpack(*row) for row in cur.fetchall()])
+
+
+def write_samples(cur, account_id, ts, bpm, source):
+    # Merges the samples into their day chunks (new values win on equal
+    # timestamps) and upserts the touched days in one statement. Returns days written.
+    if len(ts) == 0:
+        return 0
+    days = ts.astype("datetime64[D]")
+    first, last = days.min().item(), days.max().item()
+
+    old_ts, old_bpm, old_source = _read_days(cur, account_id, first, last)
+    all_ts = np.concatenate([ts, old_ts])
+    all_bpm = np.concatenate([bpm, old_bpm])
+    all_source = np.concatenate([source, old_source])
+    # np.unique keeps the first occurrence, and the new samples come first
+    all_ts, keep = np.unique(all_ts, return_index=True)
+    all_bpm, all_source = all_bpm[keep], all_source[keep]
+
+    all_days = all_ts.astype("datetime64[D]")
+    touched = np.unique(days)
+    lo = np.searchsorted(all_days, touched, side="left")
+    hi = np.searchsorted(all_days, touched, side="right")
+    rows = []
+    for day, a, b in zip(touched, lo, hi):
+        offsets = (all_ts[a:b] - day.astype("datetime64[s]")).astype(OFFSET_DTYPE)
+        rows.append((account_id, day.item(), b - a, "\\x" + offsets.tobytes().hex(),
+                     "\\x" + all_bpm[a:b].tobytes().hex(), "\\x" + all_source[a:b].tobytes().hex()))
+    frame = pd.DataFrame(rows, columns=["account_id", "day", "samples", "offsets", "bpm", "source"])
+
+    cur.execute(f"""
+        CREATE TEMP TABLE {TABLE}_stage ON COMMIT DROP AS
+        SELECT account_id, day, samples, offsets, bpm, source FROM {TABLE} WITH NO DATA
+    """)
+    db.copy_frame(cur, frame, f"{TABLE}_stage")
+    cur.execute(f"""
+        INSERT INTO {TABLE} (account_id, day, samples, offsets, bpm, source)
+        SELECT account_id, day, samples, offsets, bpm, source FROM {TABLE}_stage
+        ON CONFLICT (account_id, day) DO UPDATE
+        SET samples = EXCLUDED.samples, offsets = EXCLUDED.offsets, bpm = EXCLUDED.bpm,
+            source = EXCLUDED.source, updated_at = now()
+        WHERE ({TABLE}.offsets, {TABLE}.bpm, {TABLE}.source)
+              IS DISTINCT FROM (EXCLUDED.offsets, EXCLUDED.bpm, EXCLUDED.source)
+    """)
+    written = cur.rowcount
+    cur.execute(f"DROP TABLE {TABLE}_stage")
+    return written
+
+
+def read_range(account_id, start, end):
+    # Samples for days start..end inclusive: (timestamps datetime64[s] UTC, bpm uint8, source uint8)
+    with db.connection("oura") as conn, conn.cursor() as cur:
+        return _read_days(cur, account_id, start, end)
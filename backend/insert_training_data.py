@@ -1,32 +1,142 @@
-import pandas as pd
-import psycopg2
+import glob
+import hashlib
+import os
+import sys
+import time
+import uuid
 
+import db
+import training_summary
+from generate_training_data import DEFAULT_OUT_DIR
 
-df = pd.read_csv(r"R:\fitness_recommender\data\TrainingData.csv")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from csv_stream import CleanedCSVStream
 
-conn = psycopg2.connect(
-    dbname="fitness_coach",
-    user="postgres",           # use your actual user
-    password="password",     # use your actual password
-    host="localhost",
-    port="5432"
-)
-cur = conn.cursor()
+COLUMNS = ["steps", "heart_rate", "sleep_hours", "stress_level", "previous_workout", "recommended_workout"]
+CHUNK_ROWS = 50_000
 
-for _, row in df.iterrows():
+
+def file_checksum(path, block_size=1 << 20):
+    # md5 of the file's bytes, read in blocks; identifies an export whatever its path
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return str(uuid.UUID(digest.hexdigest()))
+
+
+def ensure_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS TrainingData (
+            data_id SERIAL PRIMARY KEY,
+            steps INTEGER,
+            heart_rate INTEGER,
+            sleep_hours REAL,
+            stress_level INTEGER,
+            previous_workout TEXT,
+            recommended_workout TEXT
+        )
+    """)
+    # Each loaded row remembers where it came from: the source file's checksum and
+    # its line in that file. Re-running a file is skipped row by row, while rows
+    # that merely have equal values (common in this data) are all kept. Rows from
+    # older loaders start without a source; load_csv claims them (see claim_legacy).
+    cur.execute("ALTER TABLE TrainingData ADD COLUMN IF NOT EXISTS source_file UUID")
+    cur.execute("ALTER TABLE TrainingData ADD COLUMN IF NOT EXISTS source_line INTEGER")
     cur.execute("""
-        INSERT INTO TrainingData (steps, heart_rate, sleep_hours, stress_level, previous_workout, recommended_workout)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (
-        row["steps"],
-        row["heart_rate"],
-        row["sleep_hours"],
-        row["stress_level"],
-        row["previous_workout"],
-        row["recommended_workout"]
-    ))
-
-conn.commit()
-cur.close()
-conn.close()
-print("✅ Data inserted into PostgreSQL TrainingData table successfully.")
+        CREATE UNIQUE INDEX IF NOT EXISTS trainingdata_source_key ON TrainingData (source_file, source_line)
+    """)
+    # The earlier content-hash key treated equal rows as duplicates
+    cur.execute("DROP INDEX IF EXISTS trainingdata_row_hash_key")
+    cur.execute("ALTER TABLE TrainingData DROP COLUMN IF EXISTS row_hash")
+
+
+def claim_legacy(cur, source_file):
+    # Rows inserted by older loaders (no source) that this file also contains get
+    # its checksum and line numbers, so the insert below skips them instead of
+    # loading them a second time. Equal rows are paired off by occurrence: the
+    # k-th legacy copy (by data_id, i.e. insert order) takes the file's k-th line
+    # with those values, so duplicates within the file are kept, not collapsed.
+    cur.execute("SELECT EXISTS (SELECT 1 FROM TrainingData WHERE source_file IS NULL)")
+    if not cur.fetchone()[0]:
+        return 0
+    row = f"md5(ROW({', '.join(COLUMNS)})::text)"
+    cur.execute(f"""
+        WITH legacy AS (
+            SELECT data_id, {row} AS content,
+                   row_number() OVER (PARTITION BY {row} ORDER BY data_id) AS n
+            FROM TrainingData WHERE source_file IS NULL
+        ), staged AS (
+            SELECT source_line, {row} AS content,
+                   row_number() OVER (PARTITION BY {row} ORDER BY source_line) AS n
+            FROM training_stage
+        )
+        UPDATE TrainingData t SET source_file = %s, source_line = staged.source_line
+        FROM legacy JOIN staged USING (content, n)
+        WHERE t.data_id = legacy.data_id
+          AND NOT EXISTS (SELECT 1 FROM TrainingData o
+                          WHERE o.source_file = %s AND o.source_line = staged.source_line)
+    """, (source_file, source_file))
+    return cur.rowcount
+
+
+def load_csv(path, chunk_rows=CHUNK_ROWS):
+    # COPY streams the file into a staging table chunk by chunk (memory stays flat),
+    # then one merge inserts only the (file, line) pairs TrainingData doesn't have yet.
+    # Returns (rows read, rows inserted).
+    source_file = file_checksum(path)
+    with db.connection("fitness") as conn, conn.cursor() as cur:
+        ensure_schema(cur)
+        cur.execute(f"""
+            CREATE TEMP TABLE training_stage ON COMMIT DROP AS
+            SELECT {', '.join(COLUMNS)} FROM TrainingData WITH NO DATA
+        """)
+        # COPY inserts rows in file order, so the identity is the data row's number
+        cur.execute("ALTER TABLE training_stage ADD COLUMN source_line INTEGER GENERATED ALWAYS AS IDENTITY")
+
+        with CleanedCSVStream(path, chunk_rows=chunk_rows) as stream:
+            missing = [col for col in COLUMNS if col not in stream.header]
+            if missing:
+                raise ValueError(f"{path} is missing columns: {', '.join(missing)}")
+            # Any extra columns in the file land in scratch columns and are ignored
+            columns = []
+            for i, col in enumerate(stream.header):
+                if col not in COLUMNS:
+                    col = f"_extra_{i}"
+                    cur.execute(f"ALTER TABLE training_stage ADD COLUMN {col} TEXT")
+                columns.append(col)
+            cur.copy_expert(f"COPY training_stage ({', '.join(columns)}) FROM STDIN WITH CSV", stream)
+            stream.report()
+
+        claimed = claim_legacy(cur, source_file)
+        if claimed:
+            print(f"🔗 {os.path.basename(path)}: {claimed:,} rows from an older load matched to their lines")
+
+        cur.execute(f"""
+            INSERT INTO TrainingData ({', '.join(COLUMNS)}, source_file, source_line)
+            SELECT {', '.join(COLUMNS)}, %s, source_line FROM training_stage
+            ON CONFLICT (source_file, source_line) DO NOTHING
+        """, (source_file,))
+        inserted = cur.rowcount
+
+        # Keep the dashboard summary in step with the table, in the same transaction
+        if inserted:
+            training_summary.refresh(cur)
+        return stream.rows, inserted
+
+
+if __name__ == "__main__":
+    # Paths or globs; by default the TrainingData-*.csv shards from generate_training_data.py
+    patterns = sys.argv[1:] or [os.path.join(DEFAULT_OUT_DIR, "TrainingData-*.csv")]
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        raise SystemExit(f"❌ No input files match {', '.join(patterns)}")
+
+    # Settings come from FITNESS_DB_* env vars (see db.py)
+    for path in paths:
+        started = time.perf_counter()
+        rows, new = load_csv(path)
+        print(f"📦 {os.path.basename(path)}: {rows:,} rows read, {new:,} new, {rows - new:,} already loaded "
+              f"({time.perf_counter() - started:.1f}s)")
+
+    print("✅ Data inserted into PostgreSQL TrainingData table successfully.")
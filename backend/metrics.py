@@ -0,0 +1,282 @@
+import bisect
+import collections
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process latency histograms and row counters, served in the Prometheus text
+# format on /metrics by install(server). Everything lives in this process: the
+# dashboards' background sync records its phases here too, while scripts run
+# from the command line just discard theirs.
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Sampling profiler for slow requests: off unless METRICS_PROFILE=1. Only the
+# environment turns it on; /metrics/profile just reads what it captured.
+PROFILE = os.environ.get("METRICS_PROFILE", "0") == "1"
+PROFILE_INTERVAL = 0.005
+PROFILE_SLOW_SECONDS = float(os.environ.get("METRICS_SLOW_SECONDS", "1.0"))
+PROFILE_KEEP = 20
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    # Exact: integral values as ints, others with repr's shortest round-trip form
+    # (":g" keeps 6 digits, so large row counts would plateau in rate())
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = collections.defaultdict(float)
+        with _registry_lock:
+            _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self.lock:
+            self.values[key] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self.series = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += n
+                    le = bound if bound == "+Inf" else f"{bound:g}"
+                    labels = _labels(self.label_names, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+http_seconds = Histogram("http_request_seconds", "Flask request latency, including Dash serialization",
+                         ["path", "method", "status"])
+callback_seconds = Histogram("dash_callback_seconds", "Dash callback latency", ["callback"])
+callback_errors = Counter("dash_callback_errors_total", "Dash callbacks that raised", ["callback"])
+figure_cache_total = Counter("figure_cache_requests_total", "Figure cache lookups", ["view", "result"])
+db_seconds = Histogram("db_query_seconds", "Statement latency on pooled connections", ["db", "query"])
+db_rows = Counter("db_rows_total", "Rows returned or affected by statements", ["db", "query"])
+sync_seconds = Histogram("sync_phase_seconds", "Oura sync phase latency", ["phase"])
+sync_rows = Counter("sync_rows_total", "Rows handled by each Oura sync phase", ["phase"])
+
+
+@contextmanager
+def timed(histogram, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def phase(name):
+    # with metrics.phase("fetch"): ...
+    return timed(sync_seconds, phase=name)
+
+
+def timed_callback(fn):
+    # Goes between @app.callback and the function (outside any memoize), so
+    # cache hits are measured as well
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            # PreventUpdate is Dash's normal "no change" signal, not a failure
+            if type(e).__name__ != "PreventUpdate":
+                callback_errors.inc(callback=name)
+            raise
+        finally:
+            callback_seconds.observe(time.perf_counter() - started, callback=name)
+    return wrapper
+
+
+_QUERY_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|VIEW|COPY|TRUNCATE)\s+(?:ONLY\s+|IF\s+(?:NOT\s+)?EXISTS\s+)?([\w.\"]+)",
+                          re.IGNORECASE)
+
+
+def query_label(sql):
+    # "SELECT oura_trends", "INSERT trainingdata", ...: low-cardinality names for statements
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors="replace")
+    words = sql.split(None, 1)
+    if not words:
+        return "empty"
+    verb = words[0].upper()
+    match = _QUERY_TABLE.search(sql)
+    if match is None:
+        return verb
+    table = match.group(1).replace('"', "").lower()
+    return f"{verb} {table}"
+
+
+def observe_query(db, sql, seconds, rows):
+    label = query_label(sql)
+    db_seconds.observe(seconds, db=db, query=label)
+    if rows > 0:
+        db_rows.inc(rows, db=db, query=label)
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    # One background thread samples the stacks of the threads currently serving
+    # a request every `interval` seconds. Requests slower than `slow_seconds`
+    # keep their samples as collapsed stacks (flamegraph.pl / speedscope input).
+    def __init__(self, interval=PROFILE_INTERVAL, slow_seconds=PROFILE_SLOW_SECONDS, keep=PROFILE_KEEP):
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.lock = threading.Lock()
+        self.active = {}
+        self.slow = collections.deque(maxlen=keep)
+        self.enabled = False
+        self.thread = None
+
+    def enable(self, on=True):
+        with self.lock:
+            self.enabled = on
+            if on and (self.thread is None or not self.thread.is_alive()):
+                self.thread = threading.Thread(target=self._run, name="metrics-profiler", daemon=True)
+                self.thread.start()
+            if not on:
+                self.active.clear()
+
+    def begin(self):
+        if self.enabled:
+            with self.lock:
+                self.active[threading.get_ident()] = collections.Counter()
+
+    def end(self, label, seconds):
+        with self.lock:
+            samples = self.active.pop(threading.get_ident(), None)
+        if samples and seconds >= self.slow_seconds:
+            self.slow.append((time.strftime("%Y-%m-%d %H:%M:%S"), label, seconds, samples))
+
+    def _run(self):
+        me = threading.get_ident()
+        while self.enabled:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, samples in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != me:
+                        samples[_stack(frame)] += 1
+
+    def report(self):
+        blocks = []
+        for when, label, seconds, samples in list(self.slow):
+            lines = [f"# {when} {label} {seconds:.3f}s, {sum(samples.values())} samples"]
+            lines += [f"{stack} {count}" for stack, count in samples.most_common()]
+            blocks.append("\n".join(lines))
+        return "\n\n".join(blocks) + "\n" if blocks else "# no slow requests captured\n"
+
+
+profiler = SamplingProfiler()
+if PROFILE:
+    profiler.enable()
+
+
+def install(server):
+    # Request timing, /metrics and /metrics/profile on a Dash app's Flask server
+    from flask import Response, g, request
+
+    @server.before_request
+    def _metrics_start():
+        g.metrics_started = time.perf_counter()
+        profiler.begin()
+
+    @server.after_request
+    def _metrics_finish(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            seconds = time.perf_counter() - started
+            # The URL rule, not the raw path, so /export/<table> stays one series
+            path = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            http_seconds.observe(seconds, path=path, method=request.method, status=response.status_code)
+            profiler.end(f"{request.method} {request.full_path}", seconds)
+        return response
+
+    def metrics_view():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    def profile_view():
+        # Read-only: lists captured slow requests (start the process with METRICS_PROFILE=1)
+        state = "on" if profiler.enabled else "off"
+        header = f"# profiler {state}, requests over {profiler.slow_seconds:g}s are kept\n"
+        return Response(header + profiler.report(), mimetype="text/plain")
+
+    server.add_url_rule("/metrics", "metrics", metrics_view)
+    server.add_url_rule("/metrics/profile", "metrics_profile", profile_view)
@@ -0,0 +1,301 @@
+import argparse
+import os
+import threading
+from datetime import date
+
+from psycopg2 import sql
+
+import db
+import oura_rollups
+
+# Versioned schema changes for the oura database. Each migration runs once, in
+# order, and is recorded in schema_migrations; every step is written so it is
+# also safe on databases that already had the change applied by hand or by the
+# older ensure_schema() code.
+
+# Rows written before accounts existed belong to this account
+DEFAULT_ACCOUNT = os.environ.get("OURA_ACCOUNT", "default")
+# Months of partitions kept ahead of today when oura_trends is partitioned
+PARTITION_MONTHS_AHEAD = 12
+# Arbitrary key for pg_advisory_xact_lock, so concurrent syncs don't migrate twice
+LOCK_KEY = 7_283_114
+
+OURA_TRENDS_COLUMNS = """
+    date DATE,
+    restfulness_score INT,
+    deep_sleep_score INT,
+    readiness_score INT,
+    resting_heart_rate_score INT,
+    sleep_latency_score INT,
+    low_activity_time INT,
+    lowest_resting_heart_rate INT,
+    medium_activity_time INT,
+    temperature_trend_deviation TEXT,
+    activity_balance_score INT,
+    training_volume_score INT,
+    sleep_latency INT,
+    sleep_timing INT,
+    average_hrv FLOAT,
+    high_activity_time INT,
+    sleep_balance_score INT,
+    restless_sleep FLOAT,
+    average_resting_heart_rate FLOAT,
+    rest_time INT,
+    long_periods_of_inactivity INT,
+    hrv_balance_score INT,
+    total_sleep_duration INT,
+    sleep_efficiency_score INT,
+    sleep_timin_score INT,
+    inactive_time INT,
+    previous_night_score INT,
+    recovery_index_score INT,
+    meet_daily_targets_score INT,
+    total_sleep_score INT,
+    sleep_score INT,
+    temperature_deviation FLOAT,
+    equivalent_walking_distance FLOAT,
+    bedtime_start TEXT,
+    bedtime_end TEXT,
+    sleep_efficiency FLOAT,
+    non_wear_time INT,
+    stay_active_score INT,
+    steps INT,
+    activity_score INT,
+    awake_time INT,
+    rem_sleep_duration INT,
+    rem_sleep_score INT,
+    respiratory_rate FLOAT,
+    deep_sleep_duration INT,
+    light_sleep_duration INT,
+    move_every_hour_score INT,
+    activity_burn INT,
+    average_met FLOAT,
+    temperature_score INT,
+    training_frequency_score INT,
+    total_bedtime FLOAT,
+    total_burn INT,
+    previous_day_activity_score INT
+"""
+
+
+def _exists(cur, name):
+    cur.execute("SELECT to_regclass(%s)", (name,))
+    return cur.fetchone()[0] is not None
+
+
+def create_oura_trends(cur):
+    cur.execute(f"CREATE TABLE IF NOT EXISTS oura_trends ({OURA_TRENDS_COLUMNS})")
+
+
+def add_updated_at(cur):
+    # Lets the dashboard pull only rows changed since its last load
+    cur.execute("ALTER TABLE oura_trends ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()")
+    cur.execute("CREATE INDEX IF NOT EXISTS oura_trends_updated_at_idx ON oura_trends (updated_at)")
+
+
+def add_account_key(cur):
+    cur.execute(sql.SQL("ALTER TABLE oura_trends ADD COLUMN IF NOT EXISTS account_id TEXT NOT NULL DEFAULT {}")
+                .format(sql.Literal(DEFAULT_ACCOUNT)))
+    if _exists(cur, "oura_trends_account_date_key") or _exists(cur, "oura_trends_pkey"):
+        return
+    # Drop duplicates left behind by older DELETE-and-reload runs or CSV uploads
+    cur.execute("""
+        DELETE FROM oura_trends a USING oura_trends b
+        WHERE a.account_id = b.account_id AND a.date = b.date AND a.ctid < b.ctid
+    """)
+    cur.execute("CREATE UNIQUE INDEX oura_trends_account_date_key ON oura_trends (account_id, date)")
+    # The date-only key from single-account days would block a second account
+    cur.execute("DROP INDEX IF EXISTS oura_trends_date_key")
+
+
+def add_primary_key(cur):
+    # Promotes the unique index to the primary key; rows without a date can't be
+    # addressed by the sync or the dashboard, so they go
+    if _exists(cur, "oura_trends_pkey"):
+        return
+    cur.execute("DELETE FROM oura_trends WHERE date IS NULL")
+    cur.execute("ALTER TABLE oura_trends ALTER COLUMN date SET NOT NULL")
+    cur.execute("ALTER TABLE oura_trends ADD CONSTRAINT oura_trends_pkey PRIMARY KEY USING INDEX oura_trends_account_date_key")
+
+
+def add_date_indexes(cur):
+    # The primary key's B-tree serves per-account ORDER BY date and range filters.
+    # Cross-account date ranges use a BRIN index: rows arrive roughly in date
+    # order, so a few pages of block summaries replace a sequential scan.
+    cur.execute("CREATE INDEX IF NOT EXISTS oura_trends_date_brin ON oura_trends USING brin (date)")
+
+
+def create_sync_state(cur):
+    # Per-account progress for scripts/multi_account_sync.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS oura_sync_state (
+            account_id TEXT PRIMARY KEY,
+            last_synced_at TIMESTAMPTZ,
+            latest_day DATE,
+            last_error TEXT
+        )
+    """)
+
+
+def create_heartrate(cur):
+    # Intraday samples, one row of packed arrays per account and day (see heartrate_store.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS oura_heartrate (
+            account_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            samples INT NOT NULL,
+            offsets BYTEA NOT NULL,
+            bpm BYTEA NOT NULL,
+            source BYTEA NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (account_id, day)
+        )
+    """)
+
+
+def create_rollups(cur):
+    # Weekly/monthly rollup tables (see oura_rollups.py), fully built from the
+    # daily rows once; the sync and upload then refresh only what they touch
+    oura_rollups.create_tables(cur)
+    oura_rollups.refresh(cur)
+
+
+def _month(day, offset=0):
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def _create_months(cur, first, last):
+    month = _month(first)
+    while month <= last:
+        name = f"oura_trends_{month:%Y_%m}"
+        if not _exists(cur, name):
+            cur.execute(f"""
+                CREATE TABLE {name} PARTITION OF oura_trends
+                FOR VALUES FROM ('{month}') TO ('{_month(month, 1)}')
+            """)
+        month = _month(month, 1)
+
+
+def ensure_partitions(cur):
+    # Keeps PARTITION_MONTHS_AHEAD months of partitions ahead of today. Rows for
+    # months without a partition land in oura_trends_default, so writes never fail.
+    _create_months(cur, date.today(), _month(date.today(), PARTITION_MONTHS_AHEAD))
+
+
+def partition_by_month(cur):
+    # Rebuilds oura_trends as a table range-partitioned on date. Worth it for large
+    # multi-account histories: date-range queries and retention touch only the
+    # months involved. The primary key includes date, as partitioning requires.
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = 'oura_trends'::regclass")
+    if cur.fetchone()[0] == "p":
+        return
+    cur.execute("ALTER TABLE oura_trends RENAME TO oura_trends_unpartitioned")
+    for index in ("oura_trends_pkey", "oura_trends_updated_at_idx", "oura_trends_date_brin"):
+        cur.execute(f"ALTER INDEX IF EXISTS {index} RENAME TO {index.replace('oura_trends', 'oura_trends_unpartitioned')}")
+    cur.execute("""
+        CREATE TABLE oura_trends (LIKE oura_trends_unpartitioned INCLUDING DEFAULTS)
+        PARTITION BY RANGE (date)
+    """)
+    cur.execute("ALTER TABLE oura_trends ADD CONSTRAINT oura_trends_pkey PRIMARY KEY (account_id, date)")
+    cur.execute("CREATE INDEX oura_trends_updated_at_idx ON oura_trends (updated_at)")
+    cur.execute("CREATE INDEX oura_trends_date_brin ON oura_trends USING brin (date)")
+    cur.execute("CREATE TABLE oura_trends_default PARTITION OF oura_trends DEFAULT")
+
+    # Partitions must exist before the copy, or every row would go to the default
+    cur.execute("SELECT min(date) FROM oura_trends_unpartitioned")
+    first = cur.fetchone()[0] or date.today()
+    _create_months(cur, first, _month(date.today(), PARTITION_MONTHS_AHEAD))
+    cur.execute("INSERT INTO oura_trends SELECT * FROM oura_trends_unpartitioned")
+    cur.execute("DROP TABLE oura_trends_unpartitioned")
+
+
+# (version, name, function). Optional migrations only run when requested.
+MIGRATIONS = [
+    (1, "create_oura_trends", create_oura_trends),
+    (2, "add_updated_at", add_updated_at),
+    (3, "add_account_key", add_account_key),
+    (4, "add_primary_key", add_primary_key),
+    (5, "add_date_indexes", add_date_indexes),
+    (6, "create_sync_state", create_sync_state),
+    (7, "create_heartrate", create_heartrate),
+    (8, "create_rollups", create_rollups),
+]
+OPTIONAL_MIGRATIONS = {
+    "partition_by_month": (100, "partition_by_month", partition_by_month),
+}
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def pending(cur, optional=()):
+    # Versions still to apply, read without the lock or any DDL. A database that
+    # has never been migrated has no schema_migrations table yet.
+    wanted = {m[0] for m in MIGRATIONS} | {OPTIONAL_MIGRATIONS[name][0] for name in optional}
+    cur.execute("SELECT to_regclass('schema_migrations')")
+    if cur.fetchone()[0] is None:
+        return wanted
+    cur.execute("SELECT version FROM schema_migrations")
+    return wanted - {row[0] for row in cur.fetchall()}
+
+
+def migrate(cur, optional=()):
+    # Applies pending migrations inside the caller's transaction; returns the names applied
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_KEY,))
+    applied = applied_versions(cur)
+    todo = [m for m in MIGRATIONS if m[0] not in applied]
+    todo += [OPTIONAL_MIGRATIONS[name] for name in optional if OPTIONAL_MIGRATIONS[name][0] not in applied]
+    for version, name, apply in sorted(todo):
+        apply(cur)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+    # Partitioned tables need next months' partitions before rows arrive for them
+    if OPTIONAL_MIGRATIONS["partition_by_month"][0] in applied | {m[0] for m in todo}:
+        ensure_partitions(cur)
+    return [name for _, name, _ in sorted(todo)]
+
+
+_migrated = False
+_migrated_lock = threading.Lock()
+
+
+def ensure_migrated():
+    # Called by the sync and upload paths before they write. The first call per
+    # process checks schema_migrations without locking and, only if something is
+    # pending, migrates in its own short transaction; later calls return at once.
+    # Writers therefore never hold the migration lock or run DDL in their own
+    # transactions, and concurrent account syncs don't serialize on it.
+    global _migrated
+    with _migrated_lock:
+        if _migrated:
+            return []
+        with db.connection("oura") as conn, conn.cursor() as cur:
+            names = migrate(cur) if pending(cur) else []
+            # Partitioned tables need next months' partitions before rows arrive for them
+            if not names and _exists(cur, "oura_trends_default"):
+                ensure_partitions(cur)
+        _migrated = True
+        return names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations to the oura database")
+    parser.add_argument("--partition", action="store_true",
+                        help="also convert oura_trends to monthly range partitions")
+    args = parser.parse_args()
+
+    with db.connection("oura") as conn, conn.cursor() as cur:
+        names = migrate(cur, ["partition_by_month"] if args.partition else [])
+    if names:
+        print(f"✅ Applied migrations: {', '.join(names)}")
+    else:
+        print("✅ Schema is up to date.")
@@ -0,0 +1,96 @@
+import db
+
+# Weekly and monthly rollups of oura_trends: mean/min/max/count per metric,
+# account and period. The sync rebuilds only the periods its upsert touched, so long-range
+# trend views read a few dozen pre-aggregated rows instead of every day.
+METRICS = [
+    "total_sleep_duration", "activity_score", "readiness_score", "average_hrv",
+    "temperature_deviation", "activity_burn", "lowest_resting_heart_rate", "sleep_efficiency",
+]
+# Resolution -> (table, date_trunc unit). Both are built from the daily rows:
+# weeks straddle month boundaries, so months can't be summed from weeks.
+ROLLUPS = {
+    "weekly": ("oura_trends_weekly", "week"),
+    "monthly": ("oura_trends_monthly", "month"),
+}
+# Widest span (in days) each resolution is used for; keeps charts under ~100 points
+RESOLUTION_SPANS = [(120, "daily"), (730, "weekly"), (None, "monthly")]
+
+
+def create_tables(cur):
+    # Run by backend/migrations.py, never from a writer's transaction. Tables from
+    # before accounts existed are derived data, so they are simply rebuilt.
+    for table, _ in ROLLUPS.values():
+        cur.execute("""
+            SELECT count(*) FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'account_id'
+        """, (table,))
+        if cur.fetchone()[0]:
+            continue
+        stats = ", ".join(
+            f"{m}_mean FLOAT8, {m}_min FLOAT8, {m}_max FLOAT8, {m}_count INT" for m in METRICS
+        )
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+        cur.execute(f"""
+            CREATE TABLE {table} (
+                account_id TEXT NOT NULL, period DATE NOT NULL, days INT NOT NULL, {stats},
+                PRIMARY KEY (account_id, period)
+            )
+        """)
+
+
+def refresh(cur, start=None, end=None, account_id=None):
+    # Recompute every period overlapping [start, end] (all periods when omitted)
+    # for one account (all accounts when omitted). Delete-then-insert also drops
+    # periods whose days were removed.
+    stats = ", ".join(
+        f"avg({m}) AS {m}_mean, min({m}) AS {m}_min, max({m}) AS {m}_max, count({m}) AS {m}_count"
+        for m in METRICS
+    )
+    for table, unit in ROLLUPS.values():
+        periods, days = ["true"], ["date IS NOT NULL"]
+        if start is not None:
+            periods.append(f"period >= date_trunc('{unit}', %(start)s::date)")
+            days.append(f"date >= date_trunc('{unit}', %(start)s::date)")
+        if end is not None:
+            periods.append(f"period < date_trunc('{unit}', %(end)s::date) + interval '1 {unit}'")
+            days.append(f"date < date_trunc('{unit}', %(end)s::date) + interval '1 {unit}'")
+        if account_id is not None:
+            periods.append("account_id = %(account)s")
+            days.append("account_id = %(account)s")
+        params = {"start": start, "end": end, "account": account_id}
+        cur.execute(f"DELETE FROM {table} WHERE {' AND '.join(periods)}", params)
+        cur.execute(f"""
+            INSERT INTO {table} (account_id, period, days,
+                                 {', '.join(f'{m}_mean, {m}_min, {m}_max, {m}_count' for m in METRICS)})
+            SELECT account_id, date_trunc('{unit}', date)::date, count(*), {stats}
+            FROM oura_trends
+            WHERE {' AND '.join(days)}
+            GROUP BY 1, 2
+        """, params)
+
+
+def update(cur, start=None, end=None, account_id=None):
+    # Called inside the writer's transaction, after its rows are in place. The
+    # tables come from the create_rollups migration, so this is DML only.
+    refresh(cur, start, end, account_id)
+
+
+def resolution_for(span_days):
+    for limit, resolution in RESOLUTION_SPANS:
+        if limit is None or span_days <= limit:
+            return resolution
+
+
+def read(resolution, metric, account_id, start=None):
+    # Columns: period, mean, min, max, count for one metric and account
+    table, unit = ROLLUPS[resolution]
+    where = "WHERE account_id = %(account)s"
+    if start is not None:
+        where += f" AND period >= date_trunc('{unit}', %(start)s::date)"
+    sql = f"""
+        SELECT period, {metric}_mean AS mean, {metric}_min AS min, {metric}_max AS max, {metric}_count AS count
+        FROM {table} {where}
+        ORDER BY period
+    """
+    return db.read_frame(sql, {"account": account_id, "start": start}, db="oura")
@@ -0,0 +1,91 @@
+import numpy as np
+import plotly.graph_objects as go
+
+import db
+
+# TrainingData charts built from aggregates computed in PostgreSQL, so the
+# number of points sent to the browser is bounded by the bins below rather than
+# by the table size.
+LINE_BINS = 500
+SLEEP_BIN_HOURS = 0.25
+
+
+def workout_counts():
+    # Pie input: one row per workout type
+    return db.read_frame("""
+        SELECT recommended_workout, count(*) AS n
+        FROM TrainingData
+        GROUP BY recommended_workout
+        ORDER BY n DESC
+    """, db="fitness")
+
+
+def steps_bins(bins=LINE_BINS):
+    # Records split into equal data_id ranges; mean/min/max steps per range.
+    # width_bucket needs no sort, so this is one sequential scan.
+    return db.read_frame("""
+        WITH bounds AS (SELECT min(data_id) AS lo, max(data_id) + 1 AS hi FROM TrainingData)
+        SELECT width_bucket(data_id, lo, hi, %(bins)s) AS bucket,
+               min(data_id) AS record,
+               avg(steps) AS mean_steps,
+               min(steps) AS min_steps,
+               max(steps) AS max_steps,
+               count(*) AS n
+        FROM TrainingData, bounds
+        WHERE steps IS NOT NULL
+        GROUP BY bucket
+        ORDER BY bucket
+    """, {"bins": bins}, db="fitness")
+
+
+def sleep_hr_bins(bin_hours=SLEEP_BIN_HOURS):
+    # 2-D histogram of sleep (binned) against heart rate (already whole bpm)
+    return db.read_frame("""
+        SELECT floor(sleep_hours / %(width)s) * %(width)s + %(width)s / 2 AS sleep_hours,
+               heart_rate,
+               count(*) AS n,
+               avg(stress_level) AS stress_level
+        FROM TrainingData
+        WHERE sleep_hours IS NOT NULL AND heart_rate IS NOT NULL
+        GROUP BY 1, 2
+    """, {"width": bin_hours}, db="fitness")
+
+
+def steps_figure(title="Steps Over Time", markers=False):
+    df = steps_bins()
+    fig = go.Figure()
+    # Min/max band keeps spikes visible after binning
+    fig.add_trace(go.Scattergl(x=df["record"], y=df["max_steps"], mode="lines", line=dict(width=0),
+                               showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scattergl(x=df["record"], y=df["min_steps"], mode="lines", line=dict(width=0),
+                               fill="tonexty", fillcolor="rgba(99, 110, 250, 0.2)", name="min-max"))
+    fig.add_trace(go.Scattergl(x=df["record"], y=df["mean_steps"], mode="lines+markers" if markers else "lines",
+                               name="steps", customdata=df["n"],
+                               hovertemplate="record %{x}<br>%{y:,.0f} steps (mean of %{customdata:,})<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title="record", yaxis_title="steps")
+    return fig
+
+
+def sleep_hr_figure(title="Sleep vs Heart Rate", labels=None):
+    df = sleep_hr_bins()
+    labels = labels or {}
+    # One marker per occupied bin: size by row count, colour by mean stress level
+    size = 4 + 16 * np.sqrt(df["n"] / df["n"].max()) if len(df) else []
+    fig = go.Figure(go.Scattergl(
+        x=df["sleep_hours"], y=df["heart_rate"], mode="markers",
+        marker=dict(size=size, color=df["stress_level"], colorscale="Plasma", showscale=True,
+                    colorbar=dict(title="stress_level")),
+        customdata=df["n"],
+        hovertemplate="%{x:.2f} h, %{y} bpm<br>%{customdata:,} records<extra></extra>",
+    ))
+    fig.update_layout(title=title,
+                      xaxis_title=labels.get("sleep_hours", "sleep_hours"),
+                      yaxis_title=labels.get("heart_rate", "heart_rate"))
+    return fig
+
+
+def workout_figure(title="Workout Distribution"):
+    df = workout_counts()
+    fig = go.Figure(go.Pie(labels=df["recommended_workout"], values=df["n"]))
+    fig.update_layout(title=title)
+    return fig
@@ -0,0 +1,38 @@
+import db
+
+# Single-row summary of TrainingData kept in a materialized view, so dashboard
+# cards read one row instead of loading the table. Refreshed by the loader.
+VIEW = "training_summary"
+
+
+def ensure_view(cur):
+    # TrainingData has no calories column in most setups; the view then reports NULL
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'trainingdata' AND column_name = 'calories'
+    """)
+    calories = "avg(calories)" if cur.fetchone() else "NULL::float8"
+    cur.execute(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {VIEW} AS
+        SELECT count(*) AS records,
+               avg(steps) AS avg_steps,
+               avg(sleep_hours) AS avg_sleep,
+               avg(heart_rate) AS avg_hr,
+               {calories} AS avg_calories,
+               now() AS refreshed_at
+        FROM TrainingData
+    """)
+
+
+def refresh(cur):
+    ensure_view(cur)
+    cur.execute(f"REFRESH MATERIALIZED VIEW {VIEW}")
+
+
+def summary():
+    # {records, avg_steps, avg_sleep, avg_hr, avg_calories, refreshed_at}
+    with db.connection("fitness") as conn, conn.cursor() as cur:
+        ensure_view(cur)
+        cur.execute(f"SELECT * FROM {VIEW}")
+        columns = [desc[0] for desc in cur.description]
+        return dict(zip(columns, cur.fetchone()))
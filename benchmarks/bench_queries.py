@@ -0,0 +1,126 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oura_dashboard"))
+import db
+import migrations
+from data_store import VIEW_COLUMNS, apply_dtype_plan
+from synthetic import oura_trends_frame
+
+# Latency of the dashboard's oura_trends access patterns on the old schema (no
+# key, no indexes) versus the migrated one, and optionally with monthly
+# partitions. Runs in a scratch schema, so the real table is never touched.
+SCHEMA = "bench_queries"
+COLUMNS = ["date"] + sorted(set().union(*VIEW_COLUMNS.values()))
+
+
+def make_frame(years, users, seed=0):
+    df = apply_dtype_plan(oura_trends_frame(years=years, users=users, seed=seed))
+    n_days = len(df) // users
+    df["account_id"] = np.repeat([f"ring-{i:04d}" for i in range(users)], n_days)
+    # updated_at a day after each date, so "changed since" filters select recent days
+    df["updated_at"] = pd.to_datetime(df["date"]).dt.tz_localize("UTC") + pd.Timedelta(days=1)
+    # Rows arrive day by day with every account interleaved, as the multi-account sync writes them
+    return df.sort_values(["date", "account_id"], ignore_index=True)
+
+
+def build_table(conn, df, migrate=False, partition=False):
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    # The schema upload_to_postgres.py used to create, plus the columns the sync added
+    cur.execute(f"""
+        CREATE TABLE oura_trends ({migrations.OURA_TRENDS_COLUMNS},
+                                  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                                  account_id TEXT NOT NULL DEFAULT 'default')
+    """)
+    db.copy_frame(cur, df, "oura_trends")
+    if migrate:
+        migrations.migrate(cur, ["partition_by_month"] if partition else [])
+    conn.commit()
+    cur.execute("ANALYZE oura_trends")
+    conn.commit()
+    return cur
+
+
+def queries(df):
+    account = df["account_id"].iloc[-1]
+    last = pd.Timestamp(df["date"].max())
+    month_start = (last - timedelta(days=60)).replace(day=1).date()
+    select = ", ".join(COLUMNS)
+    return [
+        ("full load (one account)",
+         f"SELECT {select} FROM oura_trends WHERE account_id = %s ORDER BY date", (account,)),
+        ("refresh: changed since",
+         f"SELECT {select} FROM oura_trends WHERE updated_at > %s AND account_id = %s ORDER BY date",
+         (last - timedelta(days=3), account)),
+        ("snapshot: one day",
+         f"SELECT {select} FROM oura_trends WHERE account_id = %s AND date = %s", (account, last.date())),
+        ("trends: last 30 days",
+         f"SELECT {select} FROM oura_trends WHERE account_id = %s AND date >= %s ORDER BY date",
+         (account, (last - timedelta(days=30)).date())),
+        ("rollup: one month, all accounts",
+         "SELECT account_id, avg(steps), min(steps), max(steps), count(steps) FROM oura_trends "
+         "WHERE date >= %s AND date < %s::date + interval '1 month' GROUP BY account_id",
+         (month_start, month_start)),
+    ]
+
+
+def time_queries(cur, cases, runs):
+    results = {}
+    for name, sql, params in cases:
+        times = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            cur.execute(sql, params)
+            cur.fetchall()
+            times.append(time.perf_counter() - started)
+        results[name] = 1000 * statistics.median(times)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dashboard queries before/after the schema migrations")
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--partition", action="store_true", help="also time the monthly-partitioned schema")
+    args = parser.parse_args()
+
+    df = make_frame(args.years, args.users)
+    cases = queries(df)
+    variants = [("no keys", False, False), ("migrated", True, False)]
+    if args.partition:
+        variants.append(("partitioned", True, True))
+
+    # A dedicated connection: the scratch search_path must not leak into the pool
+    conn = psycopg2.connect(**db.db_settings("oura"))
+    timings = {}
+    try:
+        for label, migrate, partition in variants:
+            cur = build_table(conn, df, migrate, partition)
+            timings[label] = time_queries(cur, cases, args.runs)
+            cur.close()
+    finally:
+        cur = conn.cursor()
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+    print(f"{len(df):,} rows ({args.users} accounts x {args.years:g} years), median of {args.runs} runs, ms")
+    header = "".join(f"{label:>14}" for label, _, _ in variants)
+    print(f"{'query':<34}{header}{'speedup':>10}")
+    for name, _, _ in cases:
+        row = "".join(f"{timings[label][name]:>14.2f}" for label, _, _ in variants)
+        speedup = timings["no keys"][name] / timings["migrated"][name]
+        print(f"{name:<34}{row}{speedup:>9.1f}x")
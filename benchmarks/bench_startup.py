@@ -0,0 +1,49 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Time-to-first-response of oura_dashboard/oura.py with the blocking start
+# (sync with the Oura API, then SELECT *) versus the fast start (persisted
+# snapshot, background sync). Point OURA_API_BASE at scripts/fake_oura_api.py
+# (e.g. with --latency) to make the API cost reproducible.
+DASHBOARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oura_dashboard")
+URL = "http://127.0.0.1:8051/"
+
+
+def time_to_first_response(fast_start, timeout):
+    env = {**os.environ, "OURA_FAST_START": "1" if fast_start else "0"}
+    started = time.perf_counter()
+    # New session so the Dash debug reloader's child process is killed too
+    proc = subprocess.Popen([sys.executable, "oura.py"], cwd=DASHBOARD_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(URL, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.05)
+        return None
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark oura.py startup: blocking vs fast start")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    for label, fast_start in [("blocking", False), ("fast start", True)]:
+        times = [time_to_first_response(fast_start, args.timeout) for _ in range(args.runs)]
+        ok = [t for t in times if t is not None]
+        if not ok:
+            print(f"{label:>10}: no response within {args.timeout:.0f}s")
+            continue
+        print(f"{label:>10}: best {min(ok):.2f}s  mean {sum(ok) / len(ok):.2f}s  ({len(ok)}/{args.runs} runs)")
@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import psycopg2
+
+# End-to-end timings of the main operations on synthetic multi-year data, saved
+# as JSON and optionally compared against a baseline run:
+#
+#   python benchmarks/bench_suite.py --years 5 --users 20 --save-baseline
+#   python benchmarks/bench_suite.py --years 5 --users 20 --baseline benchmarks/baseline.json
+#
+# Everything is isolated from the real data: both databases are used through a
+# scratch schema (PGOPTIONS search_path, which the pool and the upload scripts
+# inherit), the columnar cache and sync watermark go to a temp dir, and the
+# Oura API is scripts/fake_oura_api.py on FAKE_PORT.
+SCHEMA = "bench_suite"
+FAKE_PORT = 8766
+FAKE_BASE = f"http://127.0.0.1:{FAKE_PORT}/v2/usercollection"
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+# A case regresses when it is this much slower than the baseline...
+DEFAULT_THRESHOLD = 0.25
+# ...and by more than this many seconds, so millisecond noise never fails a run
+MIN_DELTA = 0.005
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench_suite_")
+os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+os.environ["COLUMNAR_CACHE_DIR"] = os.path.join(WORK_DIR, "cache")
+os.environ["OURA_API_BASE"] = FAKE_BASE
+
+sys.path.append(os.path.join(BENCH_DIR, "..", "scripts"))
+sys.path.append(os.path.join(BENCH_DIR, "..", "backend"))
+sys.path.append(os.path.join(BENCH_DIR, "..", "oura_dashboard"))
+import db
+import fake_oura_api
+import heartrate_store
+import insert_training_data
+import sync_oura_api_to_postgres as oura_sync
+from data_store import apply_dtype_plan
+from oura_client import OuraClient
+from synthetic import heartrate_samples, oura_trends_frame, training_data_frame
+
+oura_sync.WATERMARK_FILE = os.path.join(WORK_DIR, "last_oura_sync.txt")
+
+
+def scratch(action):
+    # Creates or drops the scratch schema in both databases
+    for name in db.DATABASES:
+        conn = psycopg2.connect(**db.db_settings(name))
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+                if action == "create":
+                    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        finally:
+            conn.close()
+
+
+def truncate(name, table):
+    with db.connection(name) as conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", (table,))
+        if cur.fetchone()[0] is not None:
+            cur.execute(f"TRUNCATE {table}")
+
+
+def accounts(users):
+    # The first account is the one the dashboard shows
+    return [oura_sync.DEFAULT_ACCOUNT] + [f"ring-{i:04d}" for i in range(1, users)]
+
+
+def build_cases(args):
+    # (name, setup, run); setup is untimed and runs before every repetition,
+    # run returns the number of rows it handled
+    days = int(args.years * 365)
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days)
+    hr_days = min(days, args.heartrate_days)
+    state = {}
+
+    def fetch():
+        with OuraClient("bench-token", base_url=FAKE_BASE) as client:
+            state["df"] = oura_sync.fetch_oura_data(start_date, end_date, client=client)
+        return len(state["df"])
+
+    def fetch_heartrate():
+        with OuraClient("bench-token", base_url=FAKE_BASE) as client:
+            ts, _, _ = oura_sync.fetch_heartrate(end_date - timedelta(days=hr_days - 1), end_date, client=client)
+        return len(ts)
+
+    def fetched():
+        if "df" not in state:
+            fetch()
+        return state["df"]
+
+    def sync_to_postgres():
+        df = state["df"]
+        for account_id in accounts(args.users):
+            oura_sync.sync_to_postgres(df, account_id=account_id)
+        return len(df) * args.users
+
+    def write_heartrate():
+        samples = 0
+        oura_sync.ensure_schema()
+        with db.connection("oura") as conn, conn.cursor() as cur:
+            for i, account_id in enumerate(accounts(args.users)):
+                ts, bpm, source = heartrate_samples(hr_days, args.heartrate_per_day, seed=i)
+                heartrate_store.write_samples(cur, account_id, ts, bpm, source)
+                samples += len(ts)
+        return samples
+
+    # Input files are written once, outside the timed part
+    trends_csv = os.path.join(WORK_DIR, "oura_trends.csv")
+    training_csv = os.path.join(WORK_DIR, "TrainingData.csv")
+
+    def before_upload():
+        if not os.path.exists(trends_csv):
+            apply_dtype_plan(oura_trends_frame(years=args.years, seed=1)).to_csv(trends_csv, index=False)
+        truncate("oura", "oura_trends")
+
+    def upload_csv():
+        # Includes interpreter start and imports: upload_to_postgres.py only runs as a script
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, "..", "scripts", "upload_to_postgres.py"),
+                        trends_csv], check=True, stdout=subprocess.DEVNULL)
+        return days
+
+    def before_insert():
+        if not os.path.exists(training_csv):
+            training_data_frame(args.training_rows or days * args.users).to_csv(training_csv, index=False)
+        truncate("fitness", "TrainingData")
+
+    def insert_training():
+        rows, _ = insert_training_data.load_csv(training_csv)
+        return rows
+
+    def load_trends():
+        return len(db.read_frame("SELECT * FROM oura_trends", db="oura"))
+
+    def read_heartrate():
+        ts, _, _ = heartrate_store.read_range(oura_sync.DEFAULT_ACCOUNT, end_date - timedelta(days=hr_days), end_date)
+        return len(ts)
+
+    def dashboard():
+        # Imported last: oura.py builds the app, loads its store and starts a
+        # background sync (against the fake API) on import
+        if "oura" not in state:
+            import oura
+            oura.sync_job.wait()
+            oura.store.load()
+            state["oura"] = oura
+        return state["oura"]
+
+    def render_trends():
+        oura = dashboard()
+        tabs = ["sleep", "activity", "readiness", "hrv", "temp", "calories", "heart_rate", "sleep_efficiency_bar"]
+        for tab in tabs:
+            for time_range in oura.TIME_RANGES:
+                oura.render_trends_tab(tab, time_range, [])
+        return len(tabs) * len(oura.TIME_RANGES)
+
+    def display_snapshot():
+        oura = dashboard()
+        days_shown = [str(day.date()) for day in oura.store.snapshot.range("30d")["date"]]
+        for day in days_shown:
+            oura.display_oura_data(day, oura.store.version)
+        return len(days_shown)
+
+    def clear_figures():
+        dashboard().figure_cache.clear()
+
+    return [
+        ("fetch_oura_data", None, fetch),
+        ("fetch_heartrate", None, fetch_heartrate),
+        ("sync_to_postgres", lambda: (fetched(), truncate("oura", "oura_trends")), sync_to_postgres),
+        ("write_heartrate", lambda: truncate("oura", "oura_heartrate"), write_heartrate),
+        ("read_sql_query oura_trends", None, load_trends),
+        ("read_range heartrate", None, read_heartrate),
+        ("upload_to_postgres", before_upload, upload_csv),
+        ("insert_training_data", before_insert, insert_training),
+        # Writes the synced accounts back after the upload's truncate (the default
+        # account's days become updates) for the dashboard cases below
+        ("sync_to_postgres (re-sync)", fetched, sync_to_postgres),
+        ("render_trends_tab", clear_figures, render_trends),
+        ("display_oura_data", clear_figures, display_snapshot),
+    ]
+
+
+def run_cases(cases, runs, only=None):
+    results = {}
+    for name, setup, run in cases:
+        if only and not any(pattern in name for pattern in only):
+            continue
+        times = []
+        try:
+            for _ in range(runs):
+                if setup is not None:
+                    setup()
+                started = time.perf_counter()
+                rows = run()
+                times.append(time.perf_counter() - started)
+        except Exception as e:
+            print(f"⚠️ {name}: {type(e).__name__}: {e}")
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        median = statistics.median(times)
+        results[name] = {"median_s": median, "min_s": min(times), "runs_s": times, "rows": rows,
+                         "rows_per_s": rows / median if median else None}
+        print(f"   {name:<30} {median:>9.3f}s  {rows:>12,} rows")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    # Returns the names of the cases that regressed; per-case limits in the
+    # baseline's "thresholds" override the global one
+    limits = baseline.get("thresholds", {})
+    if current["params"] != baseline.get("params"):
+        print(f"⚠️ Baseline was run with {baseline.get('params')}; timings may not be comparable")
+    regressions = []
+    print(f"\n{'case':<30} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base or "error" in base or "error" in result:
+            continue
+        old, new = base["median_s"], result["median_s"]
+        change = new / old - 1 if old else 0.0
+        limit = limits.get(name, threshold)
+        regressed = change > limit and new - old > MIN_DELTA
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<30} {old:>9.3f}s {new:>9.3f}s {change:>+7.0%}" + (f"  ⚠️ over {limit:.0%}" if regressed else ""))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the sync, upload, load and dashboard paths")
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--heartrate-per-day", type=int, default=288, help="intraday samples per day (288 = 5 min)")
+    parser.add_argument("--heartrate-days", type=int, default=30, help="days of intraday samples per user")
+    parser.add_argument("--training-rows", type=int, help="TrainingData rows (default: days x users)")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="seconds added to every fake API response")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="run only cases whose name contains one of these")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="compare against this results file; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction, e.g. 0.25 = 25%%")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE_FILE}")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema for inspection")
+    args = parser.parse_args()
+
+    interval = timedelta(seconds=86_400 // args.heartrate_per_day)
+    server = fake_oura_api.serve(port=FAKE_PORT, latency=args.fake_latency, heartrate_interval=interval)
+    print(f"🧪 {args.years:g} years x {args.users} users, {args.heartrate_per_day} heart rate samples/day, "
+          f"median of {args.runs} runs")
+
+    try:
+        scratch("create")
+        created = True
+    except psycopg2.OperationalError as e:
+        # The API cases still run; the database ones are recorded as errors
+        print(f"⚠️ Database unavailable: {e}")
+        created = False
+    try:
+        results = run_cases(build_cases(args), args.runs, args.only)
+    finally:
+        if created and not args.keep:
+            scratch("drop")
+        server.shutdown()
+
+    params = {key: getattr(args, key) for key in
+              ("years", "users", "heartrate_per_day", "heartrate_days", "training_rows", "fake_latency")}
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "runs": args.runs,
+        "params": params,
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {out}")
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline written to {BASELINE_FILE}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"⚠️ {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import sync_oura_api_to_postgres as sync
+import db
+import migrations
+
+# Compares the per-row upsert path of sync_to_postgres with the COPY bulk path.
+# Everything runs in a scratch schema, so the real oura_trends table is never touched.
+SCHEMA = "bench_sync"
+
+
+def make_merged_frame(n_rows, seed=0):
+    # Same shape as fetch_oura_data's merged frame; plain dates so 1M distinct days fit
+    rng = np.random.default_rng(seed)
+    first = date(1000, 1, 1)
+    df = pd.DataFrame({"day": [first + timedelta(days=i) for i in range(n_rows)]})
+    for col, source in sync.COLUMN_MAP:
+        if col in sync.FLOAT_COLUMNS:
+            df[source] = rng.normal(50, 20, n_rows).round(2)
+        else:
+            df[source] = rng.integers(0, 20_000, n_rows)
+    # Sprinkle in missing values like the real API returns
+    df.loc[rng.random(n_rows) < 0.05, "steps"] = np.nan
+    return df
+
+
+def reset_table(cur):
+    columns = ", ".join(
+        f"{col} {'FLOAT' if col in sync.FLOAT_COLUMNS else 'INT'}" for col, _ in sync.COLUMN_MAP
+    )
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    cur.execute(f"CREATE TABLE oura_trends (date DATE, {columns})")
+    # Migrated on this connection: the scratch search_path isn't on the pool's
+    migrations.migrate(cur)
+
+
+def time_write(conn, df, bulk):
+    cur = conn.cursor()
+    reset_table(cur)
+    conn.commit()
+
+    started = time.perf_counter()
+    changed = sync.write_bulk(cur, df) if bulk else sync.write_rows(cur, df)
+    conn.commit()
+    elapsed = time.perf_counter() - started
+    cur.close()
+    return elapsed, changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-row vs COPY writes for sync_to_postgres")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    # A dedicated connection: the scratch search_path must not leak into the pool
+    conn = psycopg2.connect(**db.db_settings("oura"))
+    print(f"{'rows':>10} {'per-row s':>10} {'bulk s':>10} {'speedup':>8}")
+    try:
+        for n_rows in args.sizes:
+            df = make_merged_frame(n_rows)
+            rows_time, rows_changed = time_write(conn, df, bulk=False)
+            bulk_time, bulk_changed = time_write(conn, df, bulk=True)
+            assert rows_changed == bulk_changed == n_rows
+            print(f"{n_rows:>10,} {rows_time:>10.2f} {bulk_time:>10.2f} {rows_time / bulk_time:>7.1f}x")
+    finally:
+        cur = conn.cursor()
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
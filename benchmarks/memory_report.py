@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oura_dashboard"))
+from data_store import VIEW_COLUMNS, apply_dtype_plan
+from synthetic import oura_trends_frame
+
+# Resident size of the dashboard's oura_trends frame: SELECT * with default dtypes
+# (what oura.py used to hold) versus the dtype plan and the per-view projection.
+
+
+def frame_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory report for oura_trends column projection and dtypes")
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--users", type=int, default=1)
+    args = parser.parse_args()
+
+    full = oura_trends_frame(years=args.years, users=args.users)
+    projected_columns = ["date"] + sorted(set().union(*VIEW_COLUMNS.values()))
+    variants = [
+        ("SELECT *, default dtypes", full),
+        ("SELECT *, dtype plan", apply_dtype_plan(full)),
+        ("projected, default dtypes", full[projected_columns]),
+        ("projected, dtype plan", apply_dtype_plan(full[projected_columns])),
+    ]
+
+    baseline = frame_mb(full)
+    print(f"{len(full):,} rows ({args.years:g} years x {args.users} users), {full.shape[1]} columns")
+    for label, df in variants:
+        size = frame_mb(df)
+        print(f"{label:>28}: {size:8.2f} MB  ({size / baseline:6.1%} of baseline, {df.shape[1]} columns)")
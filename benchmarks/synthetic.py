@@ -0,0 +1,68 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oura_dashboard"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from data_store import DTYPE_PLAN
+from generate_training_data import generate
+
+# Synthetic oura_trends rows shaped like pd.read_sql_query output: nullable INT
+# columns arrive as float64, DATE as Python date objects and TEXT as str.
+
+
+def oura_trends_frame(years=5, users=1, seed=0, missing=0.03):
+    rng = np.random.default_rng(seed)
+    n_days = int(years * 365)
+    first = date.today() - timedelta(days=n_days)
+    days = np.array([first + timedelta(days=i) for i in range(n_days)], dtype=object)
+    n = n_days * users
+
+    df = pd.DataFrame({"date": np.tile(days, users)})
+    for col, kind in DTYPE_PLAN.items():
+        if col == "date":
+            continue
+        if kind == "timestamp":
+            start = pd.to_datetime(df["date"]) + pd.to_timedelta(rng.integers(21 * 60, 25 * 60, n), unit="m")
+            if col == "bedtime_end":
+                start += pd.to_timedelta(rng.integers(6 * 60, 9 * 60, n), unit="m")
+            df[col] = start.dt.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+        elif kind == "Int8":
+            df[col] = rng.integers(1, 101, n).astype(np.float64)
+        elif kind == "Int16":
+            df[col] = rng.integers(40, 80, n).astype(np.float64)
+        elif kind == "Int32":
+            df[col] = rng.integers(0, 30_000, n).astype(np.float64)
+        elif col == "temperature_trend_deviation":
+            df[col] = rng.normal(0, 0.5, n).round(2).astype(str)
+        else:
+            df[col] = rng.normal(50, 15, n).round(3)
+        df.loc[rng.random(n) < missing, col] = None
+    return df
+
+
+def training_data_frame(rows, seed=0):
+    # TrainingData rows from the generator's own rules, with Fitbit-like step and sleep distributions
+    rng = np.random.default_rng(seed)
+    steps = rng.gamma(4, 2000, rows).astype(np.int64)
+    sleep_hours = np.clip(rng.normal(7, 1.2, rows), 0, 14).round(4)
+    return generate(steps, sleep_hours, rng)
+
+
+def heartrate_samples(days, per_day=288, seed=0):
+    # Evenly spaced intraday samples for the last `days` days, shaped like
+    # heartrate_store.samples_from_docs output: (datetime64[s], bpm uint8, source uint8)
+    rng = np.random.default_rng(seed)
+    first = np.datetime64(date.today() - timedelta(days=days), "s")
+    step = 86_400 // per_day
+    ts = first + np.arange(days * per_day, dtype=np.int64) * step
+    seconds = (np.arange(days * per_day) * step) % 86_400
+    asleep = seconds < 7 * 3600
+    resting = np.repeat(rng.integers(45, 65, days), per_day)
+    bpm = (resting + np.where(asleep, rng.integers(0, 7, len(ts)), rng.integers(10, 61, len(ts)))).astype(np.uint8)
+    # Codes index heartrate_store.SOURCES: 2 = sleep, 0 = awake
+    source = np.where(asleep, 2, 0).astype(np.uint8)
+    return ts, bpm, source
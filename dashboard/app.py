@@ -1,10 +1,14 @@
 import dash
 from dash import dcc, html, Input, Output
 import dash_bootstrap_components as dbc
-import plotly.express as px
-import pandas as pd
-import psycopg2
 import subprocess
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import metrics
+import training_charts
+import training_summary
 
 external_stylesheets = [
     "https://cdn.jsdelivr.net/npm/bootswatch@5.2.3/dist/lux/bootstrap.min.css",
@@ -14,29 +18,21 @@ external_stylesheets = [
 # Run Oura import script on startup
 subprocess.run(["python", "../backend/oura_import.py"])
 
-# PostgreSQL connection
-conn = psycopg2.connect(
-    dbname="fitness_coach",
-    user="fitness_user",
-    password="fitness_user",
-    host="localhost",
-    port="5432"
-)
-query = "SELECT * FROM TrainingData"
-df = pd.read_sql_query(query, conn)
-conn.close()
-
-# Calculate summary stats
-avg_steps = int(df['steps'].mean())
-avg_sleep = round(df['sleep_hours'].mean(), 1)
-avg_hr = int(df['heart_rate'].mean())
-avg_calories = int(df['calories'].mean()) if 'calories' in df.columns else 0
-avg_sleep = round(df['sleep_hours'].mean(), 1)
-avg_hr = int(df['heart_rate'].mean())
+# Summary stats: one row from the training_summary materialized view (pooled,
+# settings from FITNESS_DB_* env vars). Charts aggregate in SQL as well, so the
+# full table is never loaded here.
+stats = training_summary.summary()
+avg_steps = int(stats['avg_steps'] or 0)
+avg_sleep = round(float(stats['avg_sleep'] or 0), 1)
+avg_hr = int(stats['avg_hr'] or 0)
+avg_calories = int(stats['avg_calories'] or 0)
 
 # Initialize Dash app
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 app.title = "Fitness Coach Dashboard"
+server = app.server
+# Latency histograms and row counts in Prometheus format on /metrics
+metrics.install(server)
 
 # Layout
 app.layout = dbc.Container([
@@ -101,19 +97,18 @@ app.layout = dbc.Container([
     dbc.Tabs([
         dbc.Tab(label="📈 Steps Over Time", children=[
             dcc.Graph(
-                figure=px.line(df, y='steps', title='Steps Trend Over Records', markers=True)
+                figure=training_charts.steps_figure(title='Steps Trend Over Records', markers=True)
             )
         ]),
         dbc.Tab(label="💤 Sleep vs Heart Rate", children=[
             dcc.Graph(
-                figure=px.scatter(df, x='sleep_hours', y='heart_rate', color='stress_level',
-                                  title='Sleep vs Heart Rate (Colored by Stress Level)',
-                                  labels={'sleep_hours': 'Sleep (hrs)', 'heart_rate': 'Heart Rate'})
+                figure=training_charts.sleep_hr_figure(title='Sleep vs Heart Rate (Colored by Stress Level)',
+                                                       labels={'sleep_hours': 'Sleep (hrs)', 'heart_rate': 'Heart Rate'})
             )
         ]),
         dbc.Tab(label="🧠 Workout Recommendations", children=[
             dcc.Graph(
-                figure=px.pie(df, names='recommended_workout', title='Workout Recommendation Distribution')
+                figure=training_charts.workout_figure(title='Workout Recommendation Distribution')
             )
         ])
     ])
@@ -125,8 +120,10 @@ app.layout = dbc.Container([
     Input("refresh-button", "n_clicks"),
     prevent_initial_call=True
 )
+@metrics.timed_callback
 def refresh_oura_data(n_clicks):
-    subprocess.run(["python", "../backend/oura_import.py"])
+    with metrics.phase("oura_import"):
+        subprocess.run(["python", "../backend/oura_import.py"])
     return "✅ Refreshed!"
 
 # Run the app
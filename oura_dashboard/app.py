@@ -1,29 +1,19 @@
 import dash
 from dash import dcc, html, Input, Output
 import dash_bootstrap_components as dbc
-import plotly.express as px
-import pandas as pd
-import psycopg2
 import subprocess
 import os
 import sys
 import random
 import threading
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from datetime import datetime
 
-# Load data from PostgreSQL
-db_params = dict(
-    dbname="fitness_coach",
-    user="fitness_user",
-    password="fitness_user",
-    host="localhost",
-    port="5432"
-)
-
-conn = psycopg2.connect(**db_params)
-df = pd.read_sql_query("SELECT * FROM TrainingData", conn)
-conn.close()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import db
+import exporter
+import metrics
+import training_charts
 
 # Randomized live snapshot values
 avg_steps = random.randint(7000, 13000)
@@ -39,6 +29,8 @@ external_stylesheets = [
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 app.title = "Fitness Coach Dashboard"
 server = app.server
+# Latency histograms and row counts in Prometheus format on /metrics
+metrics.install(server)
 
 # Launch oura.py automatically
 def launch_oura_on_start():
@@ -134,22 +126,22 @@ app.layout = dbc.Container([
     ),
 
     dbc.Row([
-        dcc.Download(id="download-data"),
-        dbc.Col(html.Button("📥 Export Fitness Data", id="btn-csv", className="btn btn-outline-secondary mt-2 mb-4 w-100"))
+        # Plain link to the streaming export route, so the file never passes through a callback
+        dbc.Col(html.A("📥 Export Fitness Data", id="btn-csv", href="/export/TrainingData?gzip=1",
+                       className="btn btn-outline-secondary mt-2 mb-4 w-100"))
     ]),
 
     dbc.Tabs([
         dbc.Tab(label="\U0001F4C8 Steps Trend", tab_id="steps", children=[
-            dcc.Graph(figure=px.line(df, y='steps', title='Steps Over Time'))
+            dcc.Graph(figure=training_charts.steps_figure(title='Steps Over Time'))
         ]),
 
         dbc.Tab(label="\U0001F4CC Sleep vs HR", tab_id="sleep_hr", children=[
-            dcc.Graph(figure=px.scatter(df, x='sleep_hours', y='heart_rate', color='stress_level',
-                                        title='Sleep vs Heart Rate'))
+            dcc.Graph(figure=training_charts.sleep_hr_figure(title='Sleep vs Heart Rate'))
         ]),
 
         dbc.Tab(label="\U0001F3C3 Workout Types", tab_id="workout", children=[
-            dcc.Graph(figure=px.pie(df, names='recommended_workout', title='Workout Distribution'))
+            dcc.Graph(figure=training_charts.workout_figure(title='Workout Distribution'))
         ])
     ], className="mt-4"),
 
@@ -163,19 +155,35 @@ app.layout = dbc.Container([
     Input("open-login", "n_clicks"),
     prevent_initial_call=True
 )
+@metrics.timed_callback
 def open_login_page(n):
     import webbrowser
     login_path = os.path.abspath("login.html")
     webbrowser.open(f"file://{login_path}")
     return "\U0001F513 Opening Login Page..."
 
-@app.callback(
-    Output("download-data", "data"),
-    Input("btn-csv", "n_clicks"),
-    prevent_initial_call=True
-)
-def export_csv(n):
-    return dcc.send_data_frame(df.to_csv, "fitness_data.csv")
+# Streams a table straight from PostgreSQL, e.g.
+# /export/oura_trends?format=parquet&columns=date,steps&start=2024-01-01&gzip=1
+@server.route('/export/<table>')
+def export_table(table):
+    columns = [col for col in request.args.get('columns', '').split(',') if col] or None
+    try:
+        body, mimetype, filename = exporter.export(
+            table,
+            fmt=request.args.get('format', 'csv'),
+            columns=columns,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            gzip=request.args.get('gzip') == '1',
+        )
+    except exporter.ExportError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, mimetype=mimetype, direct_passthrough=True,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@server.route('/db-pool')
+def db_pool_stats():
+    return jsonify(db.pool_stats())
 
 @server.route('/start-oura')
 def start_oura():
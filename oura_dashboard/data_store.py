@@ -0,0 +1,289 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Compact dtypes for oura_trends. read_sql_query would otherwise give float64 for
+# every nullable INT, int64/float64 elsewhere and Python objects for DATE/TEXT.
+_SCORES = [
+    "restfulness_score", "deep_sleep_score", "readiness_score", "resting_heart_rate_score",
+    "sleep_latency_score", "activity_balance_score", "training_volume_score", "sleep_balance_score",
+    "hrv_balance_score", "sleep_efficiency_score", "sleep_timin_score", "previous_night_score",
+    "recovery_index_score", "meet_daily_targets_score", "total_sleep_score", "sleep_score",
+    "stay_active_score", "activity_score", "rem_sleep_score", "move_every_hour_score",
+    "temperature_score", "training_frequency_score", "previous_day_activity_score",
+]
+_DURATIONS = [
+    "low_activity_time", "medium_activity_time", "high_activity_time", "sleep_latency", "sleep_timing",
+    "rest_time", "total_sleep_duration", "inactive_time", "non_wear_time", "awake_time",
+    "rem_sleep_duration", "deep_sleep_duration", "light_sleep_duration",
+]
+_COUNTS = ["steps", "activity_burn", "total_burn"]
+_SMALL_COUNTS = ["lowest_resting_heart_rate", "long_periods_of_inactivity"]
+_MEASUREMENTS = [
+    "average_hrv", "restless_sleep", "average_resting_heart_rate", "temperature_deviation",
+    "temperature_trend_deviation", "equivalent_walking_distance", "sleep_efficiency",
+    "respiratory_rate", "average_met", "total_bedtime",
+]
+DTYPE_PLAN = {
+    "date": "datetime64[ns]",
+    "bedtime_start": "timestamp",
+    "bedtime_end": "timestamp",
+    **{col: "Int8" for col in _SCORES},
+    **{col: "Int32" for col in _DURATIONS + _COUNTS},
+    **{col: "Int16" for col in _SMALL_COUNTS},
+    **{col: "float32" for col in _MEASUREMENTS},
+}
+
+# Columns each dashboard view reads; the loader selects only their union
+VIEW_COLUMNS = {
+    "snapshot": ["readiness_score", "sleep_score", "activity_score", "steps",
+                 "lowest_resting_heart_rate", "sleep_efficiency", "average_hrv"],
+    "trends": ["total_sleep_duration", "activity_score", "readiness_score", "average_hrv",
+               "temperature_deviation", "activity_burn", "lowest_resting_heart_rate", "sleep_efficiency"],
+}
+
+
+def _to_int(values, dtype):
+    # Falls back to Int64 when values don't fit (or aren't whole numbers)
+    values = pd.to_numeric(values, errors="coerce")
+    info = np.iinfo(dtype.lower())
+    known = values.dropna()
+    if known.between(info.min, info.max).all():
+        try:
+            return values.astype(dtype)
+        except (TypeError, ValueError):
+            pass
+    try:
+        return values.astype("Int64")
+    except (TypeError, ValueError):
+        return values
+
+
+def apply_dtype_plan(df, plan=DTYPE_PLAN):
+    # Frames that already match the plan (e.g. the memory-mapped cache) are
+    # returned as they are; otherwise only the converted columns are new
+    todo = [col for col, dtype in plan.items() if col in df.columns and df[col].dtype != dtype]
+    if not todo:
+        return df
+    df = df.copy(deep=False)
+    for col in todo:
+        dtype = plan[col]
+        if dtype == "datetime64[ns]":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif dtype == "timestamp":
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True)
+        elif dtype.startswith("Int"):
+            df[col] = _to_int(df[col], dtype)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    return df
+
+
+# How far below the watermark refresh() looks again, for transactions that were
+# still open (with an older now()) when the last refresh read the table
+REFRESH_OVERLAP = pd.Timedelta(minutes=10)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    # One consistent view of oura_trends. Frames are shared between requests and
+    # must be treated as read-only; a refresh always builds new ones. df is raw
+    # plus the columns prepare() replaced or added: every other column is the same
+    # array (memory-mapped when raw came from the columnar cache), not a copy.
+    version: int
+    raw: pd.DataFrame
+    df: pd.DataFrame
+    watermark: object
+    loaded_at: datetime
+    checksum: int = 0
+    # Sorted datetime64 copy of df['date'] plus bounds computed once per snapshot,
+    # so lookups are binary searches instead of full boolean scans
+    dates: np.ndarray = field(default_factory=lambda: np.array([], dtype="datetime64[ns]"))
+    min_date: pd.Timestamp = pd.NaT
+    max_date: pd.Timestamp = pd.NaT
+    range_bounds: dict = field(default_factory=dict)
+
+    def day(self, when):
+        # Row for one date, or None
+        when = np.datetime64(pd.Timestamp(when), "ns")
+        i = self.dates.searchsorted(when)
+        if i < len(self.dates) and self.dates[i] == when:
+            return self.df.iloc[i]
+        return None
+
+    def between(self, start, end):
+        # Inclusive date range as a positional slice of df
+        lo = self.dates.searchsorted(np.datetime64(pd.Timestamp(start), "ns"), side="left")
+        hi = self.dates.searchsorted(np.datetime64(pd.Timestamp(end), "ns"), side="right")
+        return self.df.iloc[lo:hi]
+
+    def range(self, name):
+        # Slice for one of the precomputed time ranges ("7d", "all", ...)
+        lo, hi = self.range_bounds.get(name, (0, 0))
+        return self.df.iloc[lo:hi]
+
+
+def index_frame(df, time_ranges):
+    # Filters and sorts only when needed: either one copies every column
+    if 'date' in df.columns and df['date'].isna().any():
+        df = df[df['date'].notna()].reset_index(drop=True)
+    if 'date' in df.columns and not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', ignore_index=True)
+    if 'date' not in df.columns or df.empty:
+        empty = np.array([], dtype="datetime64[ns]")
+        return df, dict(dates=empty, range_bounds={name: (0, 0) for name in time_ranges})
+
+    dates = df['date'].to_numpy(dtype="datetime64[ns]")
+    min_date, max_date = pd.Timestamp(dates[0]), pd.Timestamp(dates[-1])
+    range_bounds = {}
+    for name, days in time_ranges.items():
+        start = min_date if days is None else max_date - pd.Timedelta(days=days)
+        range_bounds[name] = (int(dates.searchsorted(np.datetime64(start, "ns"))), len(dates))
+    return df, dict(dates=dates, min_date=min_date, max_date=max_date, range_bounds=range_bounds)
+
+
+class DataStore:
+    # Holds the current Snapshot and replaces it wholesale on refresh. Readers
+    # take `store.snapshot` once per callback, so a swap mid-request can't give
+    # them a mix of old and new rows.
+
+    def __init__(self, query, table="oura_trends", prepare=None, time_ranges=None, load_cached=None,
+                 columns=None, dtypes=apply_dtype_plan, account=None, save_cached=None):
+        # query(sql, params) returns a DataFrame; prepare(raw) returns the frame the views use;
+        # time_ranges maps range names to a number of days back from the latest date (None = all);
+        # load_cached(columns) returns the table from a local cache (or None) for fast starts and
+        # save_cached(raw) writes each newly published table back to it;
+        # columns projects the SELECT (date/updated_at are always kept); dtypes(frame) compacts
+        # every frame read from the database; account keeps one account's rows when the
+        # table has an account_id column
+        self._query = query
+        self._account = account
+        self._load_cached = load_cached
+        self._save_cached = save_cached
+        self._columns = columns
+        self._dtypes = dtypes or (lambda frame: frame)
+        self._table = table
+        self._prepare = prepare or (lambda raw: raw)
+        self._time_ranges = time_ranges or {}
+        self._refresh_lock = threading.Lock()
+        empty = pd.DataFrame()
+        self._snapshot = Snapshot(0, empty, empty, None, datetime.now())
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @property
+    def data_version(self):
+        # Derived from the data itself (account, row count, newest updated_at and the
+        # snapshot's updated_at checksum), so processes holding the same rows agree on
+        # it; version only counts local swaps
+        snapshot = self._snapshot
+        watermark = "none" if snapshot.watermark is None or pd.isna(snapshot.watermark) \
+            else pd.Timestamp(snapshot.watermark).isoformat()
+        return f"{self._account or 'all'}-{watermark}-{len(snapshot.raw)}-{snapshot.checksum}"
+
+    def _publish(self, raw, previous):
+        watermark, checksum = None, 0
+        if 'updated_at' in raw.columns and not raw.empty:
+            watermark = raw['updated_at'].max()
+            # Sum of every updated_at in microseconds: moves whenever a row is rewritten,
+            # even by a transaction that committed below the watermark
+            checksum = sum(pd.to_datetime(raw['updated_at'], utc=True).dropna().dt.as_unit("us")
+                           .astype("int64").tolist())
+        # prepare() must not modify raw in place; it returns a frame sharing raw's columns
+        df, index = index_frame(self._prepare(raw), self._time_ranges)
+        snapshot = Snapshot(previous.version + 1, raw, df, watermark, datetime.now(), checksum=checksum, **index)
+        # Single reference assignment: readers see either the old or the new snapshot
+        self._snapshot = snapshot
+        return snapshot
+
+    def _existing(self):
+        return set(self._query(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s",
+            (self._table,),
+        )['column_name'])
+
+    def _select(self, existing):
+        if not self._columns:
+            return "*"
+        # Only project columns the table actually has (updated_at appears after the first sync)
+        wanted = ["date", "updated_at"] + [col for col in self._columns if col not in ("date", "updated_at")]
+        return ", ".join(col for col in wanted if col in existing)
+
+    def _where(self, existing, condition=None, params=()):
+        conditions, values = ([condition] if condition else []), list(params)
+        if self._account is not None and "account_id" in existing:
+            conditions.append("account_id = %s")
+            values.append(self._account)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, tuple(values) or None
+
+    def _fetch(self, condition=None, params=()):
+        existing = self._existing() if self._columns or self._account is not None else set()
+        where, values = self._where(existing, condition, params)
+        frame = self._query(f"SELECT {self._select(existing)} FROM {self._table} {where} ORDER BY date", values)
+        return self._dtypes(frame)
+
+    def _drop_deleted(self, raw):
+        # Deleted rows leave no updated_at behind: compare row counts and, when they
+        # differ, keep only the dates the table still has
+        existing = self._existing() if self._account is not None else set()
+        where, values = self._where(existing)
+        count = int(self._query(f"SELECT count(*) AS n FROM {self._table} {where}", values)['n'].iloc[0])
+        if count == len(raw):
+            return raw
+        dates = self._dtypes(self._query(f"SELECT date FROM {self._table} {where}", values))['date']
+        return raw[raw['date'].isin(dates)].reset_index(drop=True)
+
+    def load_local(self):
+        # Publishes the locally cached table without querying it from the database.
+        # Returns None when there is no usable cache; a later refresh() pulls what changed since.
+        if self._load_cached is None:
+            return None
+        columns = None
+        if self._columns:
+            columns = ["date", "updated_at"] + [col for col in self._columns if col not in ("date", "updated_at")]
+        with self._refresh_lock:
+            raw = self._load_cached(columns)
+            if raw is None:
+                return None
+            return self._publish(self._dtypes(raw), self._snapshot)
+
+    def _save(self, snapshot):
+        if self._save_cached is not None:
+            self._save_cached(snapshot.raw)
+        return snapshot
+
+    def load(self):
+        with self._refresh_lock:
+            return self._save(self._publish(self._fetch(), self._snapshot))
+
+    def refresh(self):
+        # Pulls rows whose updated_at is past the last snapshot's watermark minus
+        # REFRESH_OVERLAP: updated_at is now() at transaction start, so a sync that
+        # commits after a later one can land just below the watermark
+        with self._refresh_lock:
+            current = self._snapshot
+            if current.watermark is None or pd.isna(current.watermark):
+                return self._save(self._publish(self._fetch(), current))
+
+            changed = self._fetch("updated_at > %s", (current.watermark - REFRESH_OVERLAP,))
+            # Rows re-read from the overlap that the snapshot already holds aren't changes
+            held = pd.MultiIndex.from_frame(current.raw[['date', 'updated_at']])
+            changed = changed[~pd.MultiIndex.from_frame(changed[['date', 'updated_at']]).isin(held)]
+
+            kept = current.raw[~current.raw['date'].isin(changed['date'])]
+            raw = pd.concat([kept, changed], ignore_index=True) if not changed.empty else current.raw
+            raw = self._drop_deleted(raw)
+            if raw is current.raw:
+                return current
+            return self._save(self._publish(raw.sort_values('date', ignore_index=True), current))
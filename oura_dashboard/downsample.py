@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# Default number of points sent to the browser per series
+POINT_BUDGET = 1000
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, per
+    # bucket, the point forming the largest triangle with the previously kept
+    # point and the next bucket's average. Bucket averages are computed in one
+    # pass; the per-bucket step depends on the previous pick, so it loops over
+    # buckets (not points) with vectorized work inside.
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    counts = edges[1:] - edges[:-1]
+    avg_x = (cx[edges[1:]] - cx[edges[:-1]]) / counts
+    avg_y = (cy[edges[1:]] - cy[edges[:-1]]) / counts
+    # The "next bucket" for the last bucket is the final point
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n_out):
+    # Min/max bucketing: the lowest and highest point of each bucket, fully vectorized
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    n_buckets = (n_out - 2) // 2
+    bucket = np.arange(n) * n_buckets // n
+    order = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate((order[starts], order[ends], [0, n - 1])))
+
+
+def decimate(x, y, n_out=POINT_BUDGET, method="lttb"):
+    # Positional indices of the points to plot. NaNs are dropped first so they
+    # can't win a bucket; callers slice with .iloc[indices].
+    # to_numpy with na_value also handles nullable Int/Float columns
+    y = pd.Series(y).to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= n_out:
+        return valid
+    yv = y[valid]
+    if method == "minmax":
+        picked = minmax_indices(yv, n_out)
+    else:
+        picked = lttb_indices(_as_float(x)[valid], yv, n_out)
+    return valid[picked]
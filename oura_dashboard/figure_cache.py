@@ -0,0 +1,89 @@
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from cachetools import LRUCache
+from flask_caching import Cache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import metrics
+
+# "lru" keeps figures in this process; any Flask-Caching type (SimpleCache,
+# FileSystemCache, RedisCache) can be used instead to share them between workers
+CACHE_TYPE = os.environ.get("FIGURE_CACHE_TYPE", "lru")
+CACHE_SIZE = int(os.environ.get("FIGURE_CACHE_SIZE", "256"))
+CACHE_DIR = os.environ.get("FIGURE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "oura_figure_cache"))
+CACHE_REDIS_URL = os.environ.get("FIGURE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+class FigureCache:
+    # Memoizes callback output (figures already converted to plain dicts) keyed
+    # by view, callback inputs and the data version. The version is derived from
+    # the data (not a per-process counter), so workers sharing a cache agree on it
+    # and entries from older data stop matching.
+
+    def __init__(self, server, version, cache_type=CACHE_TYPE, max_size=CACHE_SIZE):
+        # version() returns the current data version, e.g. lambda: store.data_version
+        self._version = version
+        self._lock = threading.Lock()
+        self._lru = None
+        self._cache = None
+        if cache_type == "lru":
+            self._lru = LRUCache(maxsize=max_size)
+        else:
+            # SimpleCache/FileSystemCache evict past CACHE_THRESHOLD; for Redis, bound
+            # memory on the server with maxmemory + allkeys-lru
+            self._cache = Cache(server, config={
+                "CACHE_TYPE": cache_type,
+                "CACHE_THRESHOLD": max_size,
+                "CACHE_DIR": CACHE_DIR,
+                "CACHE_REDIS_URL": CACHE_REDIS_URL,
+                "CACHE_KEY_PREFIX": "oura-figure:",
+                "CACHE_DEFAULT_TIMEOUT": 0,
+            })
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if self._lru is not None:
+            with self._lock:
+                return self._lru.get(key)
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        if self._lru is not None:
+            with self._lock:
+                self._lru[key] = value
+        else:
+            self._cache.set(key, value)
+
+    def clear(self):
+        if self._lru is not None:
+            with self._lock:
+                self._lru.clear()
+        else:
+            self._cache.clear()
+
+    def key(self, view, args):
+        return f"{view}:{self._version()}:{json.dumps(args, default=str)}"
+
+    def memoize(self, view):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args):
+                key = self.key(view, args)
+                value = self.get(key)
+                if value is not None:
+                    self.hits += 1
+                    metrics.figure_cache_total.inc(view=view, result="hit")
+                    return value
+                self.misses += 1
+                metrics.figure_cache_total.inc(view=view, result="miss")
+                value = fn(*args)
+                self.set(key, value)
+                return value
+            return wrapper
+        return decorator
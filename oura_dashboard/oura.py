@@ -1,48 +1,80 @@
 import dash
 from dash import dcc, html, Input, Output
+from flask import jsonify
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
-import psycopg2
-from datetime import date, datetime, timedelta
-import subprocess
+from datetime import date, datetime
 import threading
 import webbrowser
-import random
 import os
 import sys
 
-# Step 1: Initial data sync from Oura API to PostgreSQL
-subprocess.run(["python", "../scripts/sync_oura_api_to_postgres.py"])
-last_synced_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-# Step 2: Load data from PostgreSQL using psycopg2
-conn = psycopg2.connect(
-    dbname="oura_data",
-    user="postgres",
-    password="password",
-    host="localhost",
-    port=5432
-)
-df = pd.read_sql_query("SELECT * FROM oura_trends ORDER BY date", conn)
-conn.close()
+from data_store import VIEW_COLUMNS, DataStore, apply_dtype_plan
+from downsample import POINT_BUDGET, decimate
+from figure_cache import FigureCache
+from sync_job import SyncJob
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import columnar_cache
+import db
+import heartrate_store
+import metrics
+import oura_rollups
+import sync_oura_api_to_postgres as oura_sync
+from oura_cleaning import impute
+
+# Fast start (default): serve the memory-mapped columnar cache right away (when its
+# version still matches the database, SQL otherwise) and sync in the background. OURA_FAST_START=0 restores the blocking sync-then-load start.
+FAST_START = os.environ.get("OURA_FAST_START", "1") != "0"
+
+# Step 2: Load data from PostgreSQL through the shared connection pool
+def query_oura(sql, params=None):
+    return db.read_frame(sql, params, db="oura")
+
+# Step 3: Fill gaps in critical fields (once per load) and convert the date column
+def prepare_data(df):
+    # Replaces only the columns it changes; the rest stay shared with the loaded frame
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df = df.copy(deep=False)
+        df['date'] = pd.to_datetime(df['date'])
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', ignore_index=True)
+    # Imputation works in float64; re-apply the compact dtype plan afterwards
+    return apply_dtype_plan(impute(df))
+
+# Options of the Trends time-range dropdown, as days back from the latest date
+TIME_RANGES = {"1d": 1, "7d": 7, "30d": 30, "all": None}
 
-# Handle NaNs in critical fields
-if 'activity_score' in df.columns:
-    df['activity_score'] = df['activity_score'].apply(lambda x: random.randint(5, 10) if pd.isna(x) else x)
+# Versioned snapshot of OURA_ACCOUNT's oura_trends rows; callbacks read store.snapshot once per request
+# and loads only the columns the views use, in compact dtypes
+store = DataStore(query_oura, prepare=prepare_data, time_ranges=TIME_RANGES,
+                  load_cached=lambda columns: columnar_cache.load_current(
+                      "oura_trends", oura_sync.DEFAULT_ACCOUNT, columns),
+                  save_cached=lambda raw: columnar_cache.save("oura_trends", oura_sync.DEFAULT_ACCOUNT, raw),
+                  columns=sorted(set().union(*VIEW_COLUMNS.values())),
+                  account=oura_sync.DEFAULT_ACCOUNT)
 
-if 'steps' in df.columns:
-    df['steps'] = df['steps'].apply(lambda x: random.randint(500, 1000) if pd.isna(x) else x)
+# Plain floats for plotly; nullable Int columns would otherwise carry pd.NA
+def as_float(values):
+    return pd.Series(values).to_numpy(dtype=float, na_value=np.nan)
 
-# Step 3: Handle NaNs in critical fields
-if 'activity_score' in df.columns:
-    df['activity_score'] = df['activity_score'].apply(lambda x: random.randint(5, 10) if pd.isna(x) else x)
+def fmt(value, spec=""):
+    return "–" if pd.isna(value) else format(value, spec)
 
-if 'steps' in df.columns:
-    df['steps'] = df['steps'].apply(lambda x: random.randint(500, 1000) if pd.isna(x) else x)
-    
-# Step 3: Convert date column to datetime
-df['date'] = pd.to_datetime(df['date'])
-DEFAULT_DATE = df['date'].max().date() if 'date' in df.columns else date.today()
+def default_date(snapshot):
+    return snapshot.max_date.date() if pd.notna(snapshot.max_date) else date.today()
+
+# Called from the sync thread once new rows are committed; pulls only the changed rows
+def swap_data(changed):
+    global last_synced_time
+    store.refresh()
+    # Keys already include the version; clearing just frees the stale entries early
+    figure_cache.clear()
+    last_synced_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+sync_job = SyncJob(oura_sync.run_sync, on_complete=swap_data)
 
 # Step 4: Initialize Dash app
 external_stylesheets = [
@@ -53,6 +85,32 @@ app = dash.Dash(__name__, external_stylesheets=external_stylesheets, suppress_ca
 server = app.server
 app.title = "Oura Wellness Dashboard"
 
+# Rendered views are cached per (view, inputs, data version); figures are stored
+# as plain dicts so cache hits also skip plotly's figure validation
+figure_cache = FigureCache(server, version=lambda: store.data_version)
+
+# Step 1: Initial data sync from Oura API to PostgreSQL, then load
+if FAST_START:
+    if store.load_local() is None:
+        store.load()
+    last_synced_time = "serving cached data, syncing in background…"
+    sync_job.start()
+else:
+    try:
+        oura_sync.run_sync()
+    except Exception as e:
+        print(f"⚠️ Initial sync failed: {e}")
+    store.load()
+    last_synced_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# Connection pool metrics for the shared DB layer
+@server.route('/db-pool')
+def db_pool_stats():
+    return jsonify(db.pool_stats())
+
+# Latency histograms and row counts in Prometheus format on /metrics
+metrics.install(server)
+
 # Step 5: Layout with sidebar and content
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
@@ -73,21 +131,29 @@ app.layout = html.Div([
 
 # Dashboard Layout
 def get_dashboard_layout():
+    snapshot = store.snapshot
+    default = default_date(snapshot)
+    min_date = snapshot.min_date.date() if pd.notna(snapshot.min_date) else default
     return html.Div([
         html.H2("Today's Wellness Snapshot", className="text-center text-primary mb-4"),
         dcc.DatePickerSingle(
             id='date-picker',
-            min_date_allowed=df['date'].min().date(),
-            max_date_allowed=df['date'].max().date(),
-            initial_visible_month=DEFAULT_DATE,
-            date=DEFAULT_DATE,
+            min_date_allowed=min_date,
+            max_date_allowed=default,
+            initial_visible_month=default,
+            date=default,
             display_format='YYYY-MM-DD',
             style={"margin": "auto", "display": "block"}
         ),
-        dcc.Loading([
+        # Plain Div rather than dcc.Loading: the status line is polled while a sync runs
+        html.Div([
             html.Button("🔁 Sync", id="sync-button", className="btn btn-warning mt-3 mb-2 d-block mx-auto"),
             html.Div(id="sync-status", className="text-center text-muted mb-4", children=f"Last synced at: {last_synced_time}")
         ]),
+        # Polls the background sync job; only enabled while a sync is running
+        dcc.Interval(id="sync-poll", interval=1000, disabled=not sync_job.running()),
+        # Snapshot version after the last sync; changes re-render views and key caches
+        dcc.Store(id="data-version", data=store.version),
         html.Div(id='oura-output', className="mt-5")
     ])
 
@@ -108,6 +174,15 @@ def get_trends_layout():
                 value="30d",
                 clearable=False,
                 style={"width": "200px"}
+            ),
+            # "Daily rows" skips the weekly/monthly rollups long ranges use; "Full
+            # resolution" skips decimation to the point budget (for zooming in)
+            dcc.Checklist(
+                id='full-resolution',
+                options=[{"label": " Daily rows", "value": "daily"},
+                         {"label": " Full resolution", "value": "full"}],
+                value=[],
+                className="ms-3 align-self-center"
             )
         ], className="d-flex justify-content-end mb-3"),
         dcc.Tabs(id="trends-tabs", value='sleep', children=[
@@ -125,25 +200,84 @@ def get_trends_layout():
 
 # Page Router
 @app.callback(Output('page-content', 'children'), Input('url', 'pathname'))
+@metrics.timed_callback
 def display_page(pathname):
     return get_trends_layout() if pathname == '/trends' else get_dashboard_layout()
 
 # Trends Chart Rendering
-@app.callback(Output('trends-tab-content', 'children'), Input('trends-tabs', 'value'), Input('time-range', 'value'))
-def render_trends_tab(tab, time_range):
-    end_date = df['date'].max()
-    start_date = df['date'].min() if time_range == 'all' else end_date - timedelta(days=int(time_range.replace("d", "")))
-    dff = df[df['date'].between(start_date, end_date)]
+@app.callback(
+    Output('trends-tab-content', 'children'),
+    Input('trends-tabs', 'value'),
+    Input('time-range', 'value'),
+    Input('full-resolution', 'value')
+)
+@metrics.timed_callback
+@figure_cache.memoize("trends")
+def render_trends_tab(tab, time_range, full_resolution):
+    dff = store.snapshot.range(time_range)
+    daily_rows = "daily" in (full_resolution or [])
+    full = "full" in (full_resolution or [])
+
+    def thin(metric):
+        # Decimate to the point budget while keeping peaks and troughs
+        if full or len(dff) <= POINT_BUDGET:
+            return dff
+        return dff.iloc[decimate(dff['date'], dff[metric], POINT_BUDGET)]
+
+    def rollup(metric):
+        # Weekly/monthly rows for long ranges; None means plot the daily rows
+        if daily_rows or dff.empty:
+            return None, None
+        first, last = dff['date'].iloc[0], dff['date'].iloc[-1]
+        resolution = oura_rollups.resolution_for((last - first).days + 1)
+        if resolution == "daily":
+            return None, None
+        try:
+            return resolution, oura_rollups.read(resolution, metric, oura_sync.DEFAULT_ACCOUNT, start=first.date())
+        except Exception as e:
+            print(f"⚠️ Rollup read failed, plotting daily rows: {e}")
+            return None, None
 
     if tab == 'sleep_efficiency_bar':
+        resolution, rolled = rollup('sleep_efficiency')
+        if rolled is not None:
+            x, y = rolled['period'], as_float(rolled['mean'])
+            title = f"Sleep Efficiency (%), {resolution} mean"
+        else:
+            dff = thin('sleep_efficiency')
+            x, y, title = dff['date'], as_float(dff['sleep_efficiency']), "Sleep Efficiency (%)"
         return dcc.Graph(
             figure=go.Figure([
-                go.Bar(x=dff['date'], y=dff['sleep_efficiency'], marker_color="#00c0ef")
-            ]).update_layout(title="Sleep Efficiency (%)", xaxis_title="Date", yaxis_title="Efficiency")
+                go.Bar(x=x, y=y, marker_color="#00c0ef")
+            ]).update_layout(title=title, xaxis_title="Date", yaxis_title="Efficiency").to_plotly_json()
         )
 
+    if tab == 'heart_rate' and not dff.empty:
+        # Intraday samples come straight from oura_heartrate as NumPy arrays
+        first, last = dff['date'].iloc[0], dff['date'].iloc[-1]
+        try:
+            ts, bpm, _ = heartrate_store.read_range(oura_sync.DEFAULT_ACCOUNT, first.date(), last.date())
+        except Exception as e:
+            print(f"⚠️ Heart rate read failed, plotting daily rows: {e}")
+            ts = []
+        if len(ts):
+            if not full:
+                # Min/max buckets keep the spikes that LTTB can smooth over at this density
+                keep = decimate(ts, bpm, POINT_BUDGET, method="minmax")
+                ts, bpm = ts[keep], bpm[keep]
+            daily = dff[dff['lowest_resting_heart_rate'].notna()]
+            traces = [
+                go.Scattergl(x=ts, y=bpm, mode='lines', name='Heart Rate', line=dict(color='#17becf', width=1)),
+                go.Scattergl(x=daily['date'], y=as_float(daily['lowest_resting_heart_rate']), mode='markers',
+                             name='Lowest Resting', marker=dict(color='#d62728')),
+            ]
+            return dcc.Graph(
+                figure=go.Figure(traces).update_layout(title="Heart Rate (bpm)", xaxis_title="Time",
+                                                       yaxis_title="Heart Rate (bpm)").to_plotly_json()
+            )
+
     metric_map = {
-        'sleep': ('total_sleep_duration', 'Sleep Duration (hrs)', '#1f77b4'),
+        'sleep':('total_sleep_duration', 'Sleep Duration (hrs)', '#1f77b4'),
         'activity': ('activity_score', 'Activity Score', '#2ca02c'),
         'readiness': ('readiness_score', 'Readiness Score', '#ff7f0e'),
         'hrv': ('average_hrv', 'HRV (ms)', '#9467bd'),
@@ -152,43 +286,61 @@ def render_trends_tab(tab, time_range):
         'heart_rate': ('lowest_resting_heart_rate', 'Heart Rate (bpm)', '#17becf')
     }
     metric, label, color = metric_map[tab]
-    y_data = dff[metric] / 60 if tab == 'sleep' else dff[metric]
+    scale = 60 if tab == 'sleep' else 1
+
+    resolution, rolled = rollup(metric)
+    if rolled is not None:
+        # Period mean with a min/max band
+        x = rolled['period']
+        traces = [
+            go.Scatter(x=x, y=as_float(rolled['max']) / scale, mode='lines', line=dict(width=0),
+                       showlegend=False, hoverinfo='skip'),
+            go.Scatter(x=x, y=as_float(rolled['min']) / scale, mode='lines', line=dict(width=0),
+                       fill='tonexty', fillcolor='rgba(128, 128, 128, 0.2)', name='min-max'),
+            go.Scatter(x=x, y=as_float(rolled['mean']) / scale, mode='lines+markers', name=label,
+                       line=dict(color=color)),
+        ]
+        title = f"{label} Over Time ({resolution} mean)"
+    else:
+        dff = thin(metric)
+        traces = [go.Scatter(x=dff['date'], y=as_float(dff[metric]) / scale, mode='lines+markers', name=label,
+                             line=dict(color=color))]
+        title = label + " Over Time"
 
     return dcc.Graph(
-        figure=go.Figure([
-            go.Scatter(x=dff['date'], y=y_data, mode='lines+markers', name=label, line=dict(color=color))
-        ]).update_layout(title=label + " Over Time", xaxis_title="Date", yaxis_title=label)
+        figure=go.Figure(traces).update_layout(title=title, xaxis_title="Date", yaxis_title=label).to_plotly_json()
     )
 
 # Dashboard Metrics Output
-@app.callback(Output("oura-output", "children"), Input("date-picker", "date"))
-def display_oura_data(selected_date):
-    df_day = df[df['date'] == pd.to_datetime(selected_date)]
-    if df_day.empty:
+@app.callback(Output("oura-output", "children"), Input("date-picker", "date"), Input("data-version", "data"))
+@metrics.timed_callback
+@figure_cache.memoize("snapshot")
+def display_oura_data(selected_date, _data_version):
+    row = store.snapshot.day(selected_date) if selected_date else None
+    if row is None:
         return html.P(f"No data for {selected_date}", className="text-center text-danger")
 
-    row = df_day.iloc[0]
     return html.Div([
         html.Div([
             html.Div([
                 html.H5("Readiness", className="text-muted"),
-                html.H3(f"{row['readiness_score']}", className="text-primary")
+                html.H3(f"{fmt(row['readiness_score'])}", className="text-primary")
             ], className="col-md-2 text-center"),
             html.Div([
                 html.H5("Sleep Score", className="text-muted"),
-                html.H3(f"{row['sleep_score']}", className="text-success")
+                html.H3(f"{fmt(row['sleep_score'])}", className="text-success")
             ], className="col-md-2 text-center"),
             html.Div([
                 html.H5("Activity Score", className="text-muted"),
-                html.H3(f"{row['activity_score']}", className="text-warning")
+                html.H3(f"{fmt(row['activity_score'])}", className="text-warning")
             ], className="col-md-2 text-center"),
             html.Div([
                 html.H5("Steps", className="text-muted"),
-                html.H3(f"{row['steps']:,}", className="text-info")
+                html.H3(f"{fmt(row['steps'], ',')}", className="text-info")
             ], className="col-md-2 text-center"),
             html.Div([
                 html.H5("Heart Rate", className="text-muted"),
-                html.H3(f"{row['lowest_resting_heart_rate']} bpm", className="text-danger")
+                html.H3(f"{fmt(row['lowest_resting_heart_rate'])} bpm", className="text-danger")
             ], className="col-md-2 text-center")
         ], className="row mb-4 justify-content-around"),
 
@@ -197,7 +349,7 @@ def display_oura_data(selected_date):
                 dcc.Graph(
                     figure=go.Figure(go.Indicator(
                         mode="gauge+number",
-                        value=row['sleep_efficiency'],
+                        value=None if pd.isna(row['sleep_efficiency']) else float(row['sleep_efficiency']),
                         title={'text': "Sleep Efficiency (%)"},
                         gauge={
                             'axis': {'range': [0, 100]},
@@ -208,14 +360,14 @@ def display_oura_data(selected_date):
                                 {'range': [85, 100], 'color': "#d4f4dd"}
                             ]
                         }
-                    ))
+                    )).to_plotly_json()
                 )
             ], className="col-md-6"),
             html.Div([
                 dcc.Graph(
                     figure=go.Figure(go.Indicator(
                         mode="gauge+number",
-                        value=row['average_hrv'],
+                        value=None if pd.isna(row['average_hrv']) else float(row['average_hrv']),
                         title={'text': "HRV (ms)"},
                         gauge={
                             'axis': {'range': [0, 200]},
@@ -226,17 +378,37 @@ def display_oura_data(selected_date):
                                 {'range': [100, 200], 'color': "#d4f4dd"}
                             ]
                         }
-                    ))
+                    )).to_plotly_json()
                 )
             ], className="col-md-6")
         ], className="row")
     ])
 
 # Sync Button Callback
-@app.callback(Output("sync-status", "children"), Input("sync-button", "n_clicks"), prevent_initial_call=True)
-def manual_sync(n):
-    subprocess.run(["python", "../scripts/sync_oura_api_to_postgres.py"])
-    return f"✅ Last synced at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+def format_sync_status(status):
+    if status["state"] == "running":
+        return f"⏳ {status['message']} ({status['progress']:.0%})"
+    if status["state"] == "failed":
+        return f"❌ {status['message']}"
+    return f"✅ Last synced at: {last_synced_time}"
+
+@app.callback(
+    Output("sync-status", "children"),
+    Output("sync-poll", "disabled"),
+    Output("data-version", "data"),
+    Input("sync-button", "n_clicks"),
+    Input("sync-poll", "n_intervals"),
+    prevent_initial_call=True
+)
+@metrics.timed_callback
+def manual_sync(n, _n_intervals):
+    # Clicks while a sync is already running are folded into that run
+    if dash.ctx.triggered_id == "sync-button":
+        sync_job.start()
+    status = sync_job.status()
+    running = status["state"] == "running"
+    version = dash.no_update if running else store.version
+    return format_sync_status(status), not running, version
 
 # Run App
 if __name__ == '__main__':
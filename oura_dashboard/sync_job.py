@@ -0,0 +1,70 @@
+import threading
+import traceback
+from datetime import datetime
+
+
+class SyncJob:
+    # Runs the Oura sync on a background thread. Only one run is active at a
+    # time; clicks while it is running just return the current status.
+
+    def __init__(self, run, on_complete=None):
+        # run(progress=callback) does the sync; on_complete(result) swaps in the new data
+        self._run = run
+        self._on_complete = on_complete
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {
+            "state": "idle",
+            "phase": None,
+            "progress": 0.0,
+            "message": "",
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def running(self):
+        with self._lock:
+            return self._status["state"] == "running"
+
+    def start(self):
+        with self._lock:
+            if self._status["state"] == "running":
+                return False
+            self._status.update(
+                state="running", phase="starting", progress=0.0, message="Starting sync",
+                started_at=datetime.now(), finished_at=None, result=None, error=None,
+            )
+            self._thread = threading.Thread(target=self._worker, name="oura-sync", daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _progress(self, phase, fraction, message=""):
+        with self._lock:
+            self._status.update(phase=phase, progress=fraction, message=message)
+
+    def _worker(self):
+        try:
+            result = self._run(progress=self._progress)
+            if self._on_complete is not None:
+                self._progress("reload", 0.95, "Reloading dashboard data")
+                self._on_complete(result)
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self._status.update(state="failed", error=str(e), message=f"Sync failed: {e}",
+                                    finished_at=datetime.now())
+            return
+        with self._lock:
+            self._status.update(state="done", phase="done", progress=1.0, result=result,
+                                message="Sync complete", finished_at=datetime.now())
@@ -0,0 +1,113 @@
+import csv
+import io
+import os
+import time
+
+CHUNK_ROWS = 10_000
+PROGRESS_EVERY = 2.0
+
+
+class _CountingReader(io.RawIOBase):
+    # Counts bytes pulled from the source file, for progress reporting
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.raw.readinto(buffer)
+        self.bytes_read += n or 0
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+class CleanedCSVStream:
+    # File-like reader over a CSV export that cleans rows on the fly. COPY ...
+    # FROM STDIN pulls from read(); only CHUNK_ROWS rows are held at a time, so
+    # memory stays flat however large the export is.
+
+    def __init__(self, path, clean_cell=None, chunk_rows=CHUNK_ROWS, progress_every=PROGRESS_EVERY):
+        self.path = path
+        self.total_bytes = os.path.getsize(path)
+        self.clean_cell = clean_cell or (lambda cell: "" if cell == "None" else cell)
+        self.chunk_rows = chunk_rows
+        self.progress_every = progress_every
+
+        self._counter = _CountingReader(open(path, "rb", buffering=0))
+        self._text = io.TextIOWrapper(io.BufferedReader(self._counter), encoding="utf-8", newline="")
+        self._reader = csv.reader(self._text)
+        self.header = next(self._reader)
+        self._pending = ""
+        self._pos = 0
+        self._done = False
+        self.rows = 0
+        self._started = time.perf_counter()
+        self._last_report = self._started
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._text.close()
+
+    def _fill(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        clean = self.clean_cell
+        n = 0
+        for row in self._reader:
+            writer.writerow([clean(cell) for cell in row])
+            n += 1
+            if n >= self.chunk_rows:
+                break
+        if n == 0:
+            self._done = True
+        self.rows += n
+        self._maybe_report()
+        return out.getvalue()
+
+    def _maybe_report(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.progress_every:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-9)
+        mb = self._counter.bytes_read / 1024 ** 2
+        pct = self._counter.bytes_read / self.total_bytes if self.total_bytes else 1.0
+        print(f"   {self.rows:,} rows, {mb:,.1f} MB ({pct:.0%}) at {mb / elapsed:,.1f} MB/s, "
+              f"{self.rows / elapsed:,.0f} rows/s")
+
+    def _ensure(self, size):
+        # Keep at least `size` unread characters buffered (or everything that's left);
+        # _pos avoids re-slicing the whole buffer on every small read
+        while not self._done and (size < 0 or len(self._pending) - self._pos < size):
+            self._pending = self._pending[self._pos:] + self._fill()
+            self._pos = 0
+
+    def read(self, size=-1):
+        self._ensure(size)
+        end = len(self._pending) if size < 0 else self._pos + size
+        data = self._pending[self._pos:end]
+        self._pos = min(end, len(self._pending))
+        return data
+
+    def readline(self):
+        while not self._done and "\n" not in self._pending[self._pos:]:
+            self._pending = self._pending[self._pos:] + self._fill()
+            self._pos = 0
+        i = self._pending.find("\n", self._pos)
+        end = len(self._pending) if i < 0 else i + 1
+        data = self._pending[self._pos:end]
+        self._pos = end
+        return data
+
+    def report(self):
+        self._maybe_report(force=True)
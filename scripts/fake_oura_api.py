@@ -0,0 +1,219 @@
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Oura v2 usercollection API. It serves deterministic
+# daily documents, paginates with next_token and can inject latency and 429s,
+# so the fetcher and sync pipeline can be exercised without a real ring.
+
+PAGE_SIZE = 50
+# Heart rate pages are much larger, like the real API's
+HEARTRATE_PAGE_SIZE = 5000
+HEARTRATE_INTERVAL = timedelta(minutes=5)
+
+
+def _rng(token, endpoint, day):
+    seed = hashlib.sha256(f"{token}:{endpoint}:{day}".encode()).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def _daily_activity(rng, day):
+    return {
+        "score": rng.randint(40, 100),
+        "active_calories": rng.randint(100, 1200),
+        "steps": rng.randint(500, 20000),
+        "contributors": {
+            "meet_daily_targets": rng.randint(1, 100),
+            "move_every_hour": rng.randint(1, 100),
+            "stay_active": rng.randint(1, 100),
+        },
+    }
+
+
+def _daily_sleep(rng, day):
+    return {
+        "score": rng.randint(40, 100),
+        "contributors": {
+            "deep_sleep": rng.randint(1, 100),
+            "efficiency": rng.randint(60, 100),
+            "latency": rng.randint(1, 100),
+            "rem_sleep": rng.randint(1, 100),
+            "restfulness": rng.randint(1, 100),
+            "timing": rng.randint(1, 100),
+            "total_sleep": rng.randint(1, 100),
+        },
+    }
+
+
+def _daily_readiness(rng, day):
+    return {
+        "score": rng.randint(40, 100),
+        "temperature_deviation": round(rng.uniform(-1, 1), 2),
+        "contributors": {
+            "hrv_balance": rng.randint(1, 100),
+            "previous_night": rng.randint(1, 100),
+            "recovery_index": rng.randint(1, 100),
+            "resting_heart_rate": rng.randint(1, 100),
+            "sleep_balance": rng.randint(1, 100),
+        },
+    }
+
+
+DAILY_ENDPOINTS = {
+    "daily_activity": _daily_activity,
+    "daily_sleep": _daily_sleep,
+    "daily_readiness": _daily_readiness,
+}
+
+
+def daily_documents(token, endpoint, start_date, end_date):
+    docs = []
+    day = start_date
+    while day <= end_date:
+        rng = _rng(token, endpoint, day)
+        doc = {
+            "id": f"{endpoint}-{day.isoformat()}",
+            "day": day.isoformat(),
+            "timestamp": f"{day.isoformat()}T04:00:00+00:00",
+        }
+        doc.update(DAILY_ENDPOINTS[endpoint](rng, day))
+        docs.append(doc)
+        day += timedelta(days=1)
+    return docs
+
+
+def heartrate_documents(token, start, end, interval=HEARTRATE_INTERVAL):
+    # One sample every interval in [start, end): a daily rhythm around
+    # a per-day resting rate, "sleep" at night and "awake" otherwise
+    docs = []
+    day = start.date()
+    while datetime.combine(day, datetime.min.time(), start.tzinfo) < end:
+        rng = _rng(token, "heartrate", day)
+        resting = rng.randint(45, 65)
+        moment = datetime.combine(day, datetime.min.time(), start.tzinfo)
+        next_day = moment + timedelta(days=1)
+        while moment < next_day:
+            if start <= moment < end:
+                asleep = moment.hour < 7
+                bpm = resting + (rng.randint(0, 6) if asleep else rng.randint(10, 60))
+                docs.append({"bpm": bpm, "source": "sleep" if asleep else "awake",
+                             "timestamp": moment.isoformat()})
+            moment += interval
+        day += timedelta(days=1)
+    return docs
+
+
+def _encode_token(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def _decode_token(token):
+    return int(base64.urlsafe_b64decode(token.encode()).decode())
+
+
+class FakeOuraHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+        if server.latency:
+            time.sleep(server.latency)
+        if server.rate_limit_every and count % server.rate_limit_every == 0:
+            self._send(429, {"detail": "Too Many Requests"}, {"Retry-After": str(server.retry_after)})
+            return
+
+        url = urlparse(self.path)
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+        if endpoint not in DAILY_ENDPOINTS and endpoint != "heartrate":
+            self._send(404, {"detail": f"Unknown endpoint {endpoint}"})
+            return
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not token:
+            self._send(401, {"detail": "Missing token"})
+            return
+
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            offset = _decode_token(query["next_token"]) if "next_token" in query else 0
+            if endpoint == "heartrate":
+                start = datetime.fromisoformat(query["start_datetime"])
+                end = datetime.fromisoformat(query["end_datetime"]) if "end_datetime" in query else \
+                    datetime.now(start.tzinfo)
+                if end - start > timedelta(days=30):
+                    raise ValueError("heartrate ranges are limited to 30 days")
+            else:
+                start_date = date.fromisoformat(query["start_date"])
+                end_date = date.fromisoformat(query.get("end_date", datetime.now().date().isoformat()))
+        except (KeyError, ValueError) as e:
+            self._send(400, {"detail": f"Bad query: {e}"})
+            return
+
+        if endpoint == "heartrate":
+            docs = heartrate_documents(token, start, end, server.heartrate_interval)
+            page_size = server.heartrate_page_size
+        else:
+            docs = daily_documents(token, endpoint, start_date, end_date)
+            page_size = server.page_size
+        page = docs[offset:offset + page_size]
+        next_offset = offset + page_size
+        self._send(200, {
+            "data": page,
+            "next_token": _encode_token(next_offset) if next_offset < len(docs) else None,
+        })
+
+
+def serve(host="127.0.0.1", port=0, page_size=PAGE_SIZE, latency=0.0, rate_limit_every=0, retry_after=1,
+          heartrate_page_size=HEARTRATE_PAGE_SIZE, heartrate_interval=HEARTRATE_INTERVAL):
+    server = ThreadingHTTPServer((host, port), FakeOuraHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.page_size = page_size
+    server.heartrate_page_size = heartrate_page_size
+    server.heartrate_interval = heartrate_interval
+    server.latency = latency
+    server.rate_limit_every = rate_limit_every
+    server.retry_after = retry_after
+    server.base_url = f"http://{host}:{server.server_address[1]}/v2/usercollection"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Oura v2 API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    server = serve(port=args.port, page_size=args.page_size, latency=args.latency,
+                   rate_limit_every=args.rate_limit_every, retry_after=args.retry_after)
+    print(f"🧪 Fake Oura API listening on {server.base_url}")
+    print(f"   export OURA_API_BASE={server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
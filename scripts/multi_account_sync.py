@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, UTC
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import db
+import sync_oura_api_to_postgres as oura_sync
+from oura_client import OURA_API_BASE, OuraClient
+
+# Syncs many rings into oura_trends (one account_id per ring). Accounts run
+# concurrently, stalest first, behind a global and a per-account token bucket.
+
+# Registry: JSON list of {"id": "...", "token": "..."}; "token_env" may name an
+# environment variable holding the token instead
+ACCOUNTS_FILE = os.environ.get(
+    "OURA_ACCOUNTS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "accounts.json"),
+)
+MAX_ACCOUNTS = 16
+# Oura allows 5000 requests per 5 minutes per token
+ACCOUNT_RATE = 5000 / 300
+GLOBAL_RATE = 100.0
+BURST = 10
+# Each account's client fetches endpoints/windows in parallel with this many workers
+ACCOUNT_WORKERS = 3
+
+
+class TokenBucket:
+    # rate tokens per second, refilled continuously up to capacity. acquire()
+    # blocks until a token is free and records how long callers were held back.
+    def __init__(self, rate, capacity=BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0.0
+
+    def acquire(self):
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.acquired += 1
+                    self.waited += now - started
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_registry(path):
+    with open(path) as f:
+        entries = json.load(f)
+    accounts = []
+    for entry in entries:
+        token = entry.get("token") or os.environ.get(entry.get("token_env", ""))
+        if not token:
+            print(f"⚠️ Skipping account {entry.get('id')}: no token")
+            continue
+        accounts.append({"id": str(entry["id"]), "token": token})
+    return accounts
+
+
+def load_state():
+    # account_id -> (last_synced_at, latest_day)
+    # oura_sync_state is created by backend/migrations.py; migrating here, once,
+    # keeps it out of the account workers' write transactions
+    oura_sync.ensure_schema()
+    with db.connection("oura") as conn, conn.cursor() as cur:
+        cur.execute("SELECT account_id, last_synced_at, latest_day FROM oura_sync_state")
+        return {account_id: (synced, day) for account_id, synced, day in cur.fetchall()}
+
+
+def record_state(account_id, latest_day=None, error=None):
+    with db.connection("oura") as conn, conn.cursor() as cur:
+        if error is None:
+            cur.execute("""
+                INSERT INTO oura_sync_state (account_id, last_synced_at, latest_day, last_error)
+                VALUES (%s, now(), %s, NULL)
+                ON CONFLICT (account_id) DO UPDATE
+                SET last_synced_at = now(),
+                    latest_day = greatest(oura_sync_state.latest_day, EXCLUDED.latest_day),
+                    last_error = NULL
+            """, (account_id, latest_day))
+        else:
+            # Failed accounts keep their old last_synced_at, so they stay at the front of the queue
+            cur.execute("""
+                INSERT INTO oura_sync_state (account_id, last_error) VALUES (%s, %s)
+                ON CONFLICT (account_id) DO UPDATE SET last_error = EXCLUDED.last_error
+            """, (account_id, error))
+
+
+def prioritize(accounts, state):
+    # Never-synced accounts first, then the longest since their last sync
+    never = datetime.min.replace(tzinfo=UTC)
+    return sorted(accounts, key=lambda account: state.get(account["id"], (None, None))[0] or never)
+
+
+def sync_window(latest_day, full=False):
+    end_date = datetime.now(UTC).date()
+    if latest_day is None or full:
+        start_date = end_date - timedelta(days=oura_sync.DEFAULT_LOOKBACK_DAYS)
+    else:
+        start_date = latest_day - timedelta(days=oura_sync.WATERMARK_OVERLAP_DAYS)
+    return min(start_date, end_date), end_date
+
+
+def sync_account(account, state, global_bucket, base_url=OURA_API_BASE, account_rate=ACCOUNT_RATE, full=False):
+    account_id = account["id"]
+    last_synced, latest_day = state.get(account_id, (None, None))
+    bucket = TokenBucket(account_rate)
+    throttled = [0.0]
+
+    def before_request():
+        # Runs on each of the client's ACCOUNT_WORKERS threads, so the total goes
+        # through the account bucket's lock
+        waiting = time.monotonic()
+        bucket.acquire()
+        global_bucket.acquire()
+        with bucket.lock:
+            throttled[0] += time.monotonic() - waiting
+
+    start_date, end_date = sync_window(latest_day, full)
+    started = time.perf_counter()
+    result = {"account": account_id, "last_synced": last_synced, "start": start_date, "days": 0,
+              "changed": 0, "samples": 0, "error": None}
+    try:
+        with OuraClient(account["token"], base_url=base_url, max_workers=ACCOUNT_WORKERS,
+                        before_request=before_request) as client:
+            df = oura_sync.fetch_oura_data(start_date, end_date, client=client)
+            result["days"] = int(df['day'].notna().sum()) if 'day' in df.columns else 0
+            result["changed"] = oura_sync.sync_to_postgres(df, account_id=account_id)
+            newest = pd.to_datetime(df['day']).max() if result["days"] else None
+            latest_day = newest.date() if newest is not None else latest_day
+            record_state(account_id, latest_day)
+
+            # Intraday samples are best effort, as in run_sync: the daily rows are
+            # already committed and recorded
+            if oura_sync.SYNC_HEARTRATE:
+                try:
+                    result["samples"], _ = oura_sync.sync_heartrate(start_date, end_date, client=client,
+                                                                    account_id=account_id)
+                except Exception as e:
+                    print(f"⚠️ {account_id}: failed to sync heart rate: {e}")
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        try:
+            record_state(account_id, error=result["error"])
+        except Exception:
+            pass
+
+    result["seconds"] = time.perf_counter() - started
+    result["requests"] = bucket.acquired
+    result["throttled"] = throttled[0]
+    result["latest_day"] = latest_day
+    return result
+
+
+def run(accounts, base_url=OURA_API_BASE, max_accounts=MAX_ACCOUNTS, global_rate=GLOBAL_RATE,
+        account_rate=ACCOUNT_RATE, full=False):
+    state = load_state()
+    queue = prioritize(accounts, state)
+    global_bucket = TokenBucket(global_rate, capacity=max(BURST, max_accounts))
+
+    started = time.perf_counter()
+    results = []
+    # Submission order is the priority order, so stale accounts get workers first
+    with ThreadPoolExecutor(max_workers=max_accounts) as pool:
+        futures = [pool.submit(sync_account, account, state, global_bucket, base_url, account_rate, full)
+                   for account in queue]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = f"⚠️ {result['error']}" if result["error"] else f"{result['changed']} changed"
+            print(f"   {result['account']}: {result['days']} days, {status} ({result['seconds']:.1f}s)")
+    elapsed = time.perf_counter() - started
+    return results, elapsed, global_bucket
+
+
+def report(results, elapsed, global_bucket):
+    now = datetime.now(UTC)
+    today = now.date()
+    print(f"\n{'account':<16} {'lag before':>11} {'data lag':>9} {'days':>5} {'changed':>8} "
+          f"{'requests':>9} {'req/s':>7} {'rows/s':>8} {'throttled':>10}")
+    for result in sorted(results, key=lambda r: r["account"]):
+        synced = result["last_synced"]
+        lag = f"{(now - synced).total_seconds() / 3600:.1f}h" if synced else "never"
+        data_lag = f"{(today - result['latest_day']).days}d" if result["latest_day"] else "-"
+        seconds = max(result["seconds"], 1e-9)
+        print(f"{result['account']:<16} {lag:>11} {data_lag:>9} {result['days']:>5} {result['changed']:>8} "
+              f"{result['requests']:>9} {result['requests'] / seconds:>7.1f} {result['days'] / seconds:>8.1f} "
+              f"{result['throttled']:>9.1f}s" + (f"  ⚠️ {result['error']}" if result["error"] else ""))
+
+    failed = sum(1 for result in results if result["error"])
+    requests_total = sum(result["requests"] for result in results)
+    days_total = sum(result["days"] for result in results)
+    samples_total = sum(result["samples"] for result in results)
+    print(f"\n✅ {len(results) - failed}/{len(results)} accounts in {elapsed:.1f}s: "
+          f"{requests_total / elapsed:.1f} req/s, {days_total / elapsed:.1f} days/s, "
+          f"{samples_total / elapsed:,.0f} heart rate samples/s, "
+          f"global limiter held requests for {global_bucket.waited:.1f}s in total")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync many Oura accounts into oura_trends")
+    parser.add_argument("--accounts", default=ACCOUNTS_FILE, help="JSON account registry")
+    parser.add_argument("--max-accounts", type=int, default=MAX_ACCOUNTS, help="accounts synced at once")
+    parser.add_argument("--global-rate", type=float, default=GLOBAL_RATE, help="requests/s across all accounts")
+    parser.add_argument("--account-rate", type=float, default=ACCOUNT_RATE, help="requests/s per account")
+    parser.add_argument("--full", action="store_true", help="ignore stored progress and re-fetch the default window")
+    parser.add_argument("--fake", type=int, metavar="N",
+                        help="sync N generated accounts against a local fake_oura_api server")
+    parser.add_argument("--fake-latency", type=float, default=0.05)
+    parser.add_argument("--fake-rate-limit-every", type=int, default=0)
+    args = parser.parse_args()
+
+    base_url = OURA_API_BASE
+    if args.fake:
+        import fake_oura_api
+        server = fake_oura_api.serve(latency=args.fake_latency, rate_limit_every=args.fake_rate_limit_every)
+        base_url = server.base_url
+        accounts = [{"id": f"ring-{i:04d}", "token": f"fake-token-{i}"} for i in range(args.fake)]
+        print(f"🧪 {args.fake} fake accounts against {base_url}")
+    else:
+        accounts = load_registry(args.accounts)
+
+    results, elapsed, global_bucket = run(accounts, base_url, args.max_accounts, args.global_rate,
+                                          args.account_rate, args.full)
+    report(results, elapsed, global_bucket)
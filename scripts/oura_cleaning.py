@@ -0,0 +1,58 @@
+import pandas as pd
+
+# Column -> strategy applied when the dashboard loads oura_trends.
+# Strategies: "ffill" (carry the last known value), "rolling_median" (median of
+# the surrounding ROLLING_WINDOW days) and "leave_null".
+DEFAULT_STRATEGIES = {
+    "activity_score": "ffill",
+    "steps": "rolling_median",
+}
+ROLLING_WINDOW = 7
+MASK_SUFFIX = "_imputed"
+
+
+def _rolling_median(values, df, window):
+    # Median over the `window` calendar days centred on each row, so gaps in the
+    # dates don't stretch the window; a row count only when there are no usable dates
+    dates = pd.to_datetime(df['date'], errors="coerce") if 'date' in df.columns else None
+    if dates is None or dates.isna().any() or not dates.is_monotonic_increasing:
+        return values.rolling(window, min_periods=1, center=True).median()
+    by_date = pd.Series(values.to_numpy(), index=pd.DatetimeIndex(dates))
+    medians = by_date.rolling(f"{window}D", min_periods=1, center=True).median()
+    return pd.Series(medians.to_numpy(), index=values.index)
+
+
+def impute(df, strategies=None, window=ROLLING_WINDOW):
+    # Fills missing values column by column with vectorized pandas ops and adds a
+    # boolean <col>_imputed mask. Deterministic, so repeated loads of the same
+    # rows give the same frame. Expects df sorted by date; returns a new frame
+    # that shares every column it doesn't impute with df.
+    strategies = DEFAULT_STRATEGIES if strategies is None else strategies
+    out = df.copy(deep=False)
+    for col, strategy in strategies.items():
+        if col not in out.columns:
+            continue
+        values = pd.to_numeric(out[col], errors="coerce").astype("float64")
+        missing = values.isna()
+
+        if strategy == "ffill":
+            filled = values.ffill()
+        elif strategy == "rolling_median":
+            filled = values.fillna(_rolling_median(values, out, window))
+        elif strategy == "leave_null":
+            filled = values
+        else:
+            raise ValueError(f"Unknown imputation strategy {strategy!r} for {col}")
+
+        # Keep whole-number columns (scores, steps) whole after a median fill
+        known = values.dropna()
+        if not known.empty and (known % 1 == 0).all():
+            filled = filled.round()
+
+        out[col] = filled
+        out[col + MASK_SUFFIX] = missing & filled.notna()
+    return out
+
+
+def mask_columns(df):
+    return [col for col in df.columns if col.endswith(MASK_SUFFIX)]
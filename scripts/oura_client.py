@@ -0,0 +1,148 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Point this at scripts/fake_oura_api.py to run without touching the real API
+OURA_API_BASE = os.environ.get("OURA_API_BASE", "https://api.ouraring.com/v2/usercollection")
+
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+MAX_BACKOFF = 60
+REQUEST_TIMEOUT = 30
+# Long ranges are split into windows fetched in parallel; next_token pages inside a
+# window have to be followed one after another
+WINDOW_DAYS = 90
+# Intraday endpoints take start_datetime/end_datetime and accept at most this
+# many days per request
+DATETIME_ENDPOINTS = {"heartrate": 30}
+
+
+class OuraAPIError(Exception):
+    pass
+
+
+class OuraClient:
+    def __init__(self, token, base_url=OURA_API_BASE, max_workers=MAX_WORKERS,
+                 max_retries=MAX_RETRIES, window_days=WINDOW_DAYS, before_request=None):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.window_days = window_days
+        # Optional hook called before every HTTP request, e.g. a rate limiter
+        self.before_request = before_request
+
+        # One pooled session shared by all workers, so connections are reused
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_BACKOFF)
+            except ValueError:
+                try:
+                    wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(max(wait, 0), MAX_BACKOFF)
+                except (TypeError, ValueError):
+                    pass
+        # Exponential backoff with jitter so parallel workers don't retry in lockstep
+        return min(BACKOFF_BASE * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+
+    def get(self, endpoint, params):
+        url = f"{self.base_url}/{endpoint}"
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if self.before_request is not None:
+                self.before_request()
+            try:
+                response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._retry_delay(None, attempt))
+                continue
+
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code != 429 and response.status_code < 500:
+                break
+            if attempt < self.max_retries:
+                time.sleep(self._retry_delay(response, attempt))
+        raise OuraAPIError(f"{endpoint} failed: {response.status_code} {response.text}")
+
+    def fetch_window(self, endpoint, start_date, end_date, params=None):
+        if endpoint in DATETIME_ENDPOINTS:
+            # Whole days, end exclusive, so the last day's samples are included
+            params = {**(params or {}), "start_datetime": f"{start_date:%Y-%m-%d}T00:00:00+00:00",
+                      "end_datetime": f"{end_date + timedelta(days=1):%Y-%m-%d}T00:00:00+00:00"}
+        else:
+            params = {**(params or {}), "start_date": start_date.strftime("%Y-%m-%d"),
+                      "end_date": end_date.strftime("%Y-%m-%d")}
+        docs = []
+        while True:
+            body = self.get(endpoint, params)
+            docs.extend(body.get("data", []))
+            next_token = body.get("next_token")
+            if not next_token:
+                return docs
+            params = {**params, "next_token": next_token}
+
+    def windows(self, start_date, end_date, window_days=None):
+        window_days = window_days or self.window_days
+        windows = []
+        window_start = start_date
+        while True:
+            window_end = min(window_start + timedelta(days=window_days), end_date)
+            windows.append((window_start, window_end))
+            if window_end >= end_date:
+                return windows
+            window_start = window_end
+
+    def window_for(self, endpoint):
+        # Windows span window_days + 1 days (both ends inclusive)
+        if endpoint in DATETIME_ENDPOINTS:
+            return min(self.window_days, DATETIME_ENDPOINTS[endpoint] - 1)
+        return self.window_days
+
+    def fetch(self, endpoints, start_date, end_date):
+        # Every (endpoint, window) pair runs concurrently on the shared pool
+        futures = {
+            endpoint: [self.executor.submit(self.fetch_window, endpoint, ws, we)
+                       for ws, we in self.windows(start_date, end_date, self.window_for(endpoint))]
+            for endpoint in endpoints
+        }
+        results = {}
+        for endpoint, endpoint_futures in futures.items():
+            seen = set()
+            docs = []
+            for future in endpoint_futures:
+                for doc in future.result():
+                    # Adjacent windows share their boundary day; heart rate samples are keyed by timestamp
+                    key = doc.get("id") or doc.get("day") or doc.get("timestamp")
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    docs.append(doc)
+            results[endpoint] = docs
+        return results
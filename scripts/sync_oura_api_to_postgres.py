@@ -1,51 +1,148 @@
-import requests
+import argparse
+import numpy as np
 import pandas as pd
-import psycopg2
 from datetime import datetime, timedelta, UTC
 import os
+import sys
 
-OURA_TOKEN = "OURA_API_KEY"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import db
+import heartrate_store
+import metrics
+import migrations
+import oura_rollups
+from oura_cleaning import DEFAULT_STRATEGIES, impute, mask_columns
+from oura_client import OuraClient
 
-def fetch_oura_data():
-    headers = {"Authorization": f"Bearer {OURA_TOKEN}"}
-    start_date = (datetime.now(UTC) - timedelta(days=30)).strftime("%Y-%m-%d")
-    end_date = datetime.now(UTC).strftime("%Y-%m-%d")
-    params = {"start_date": start_date, "end_date": end_date}
+OURA_TOKEN = os.environ.get("OURA_TOKEN", "OURA_API_KEY")
+# Every oura_trends row belongs to an account; single-ring setups use this one
+DEFAULT_ACCOUNT = migrations.DEFAULT_ACCOUNT
+ENDPOINTS = ["daily_activity", "daily_sleep", "daily_readiness"]
+# Intraday heart rate goes to oura_heartrate (backend/heartrate_store.py); OURA_SYNC_HEARTRATE=0 turns it off
+SYNC_HEARTRATE = os.environ.get("OURA_SYNC_HEARTRATE", "1") != "0"
 
-    def get_df(endpoint):
-        url = f"https://api.ouraring.com/v2/usercollection/{endpoint}"
-        r = requests.get(url, headers=headers, params=params)
-        if r.status_code != 200:
-            raise Exception(f"{endpoint} failed: {r.text}")
-        df = pd.json_normalize(r.json()["data"])
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs")
+WATERMARK_FILE = os.path.join(LOG_DIR, "last_oura_sync.txt")
+WATERMARK_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Window used when there is no watermark yet (first run) or a full sync is requested
+DEFAULT_LOOKBACK_DAYS = 30
+# Oura keeps revising the most recent days (late sleep uploads, readiness recomputes),
+# so incremental syncs re-fetch a couple of days before the watermark
+WATERMARK_OVERLAP_DAYS = 2
+
+# oura_trends column -> merged API column, in insert order
+COLUMN_MAP = [
+    ("readiness_score", "score_readiness"),
+    ("sleep_score", "score_sleep"),
+    ("activity_score", "score"),
+    ("steps", "steps"),
+    ("sleep_efficiency", "contributors.efficiency"),
+    ("lowest_resting_heart_rate", "contributors.resting_heart_rate"),
+    ("total_sleep_duration", "contributors.total_sleep"),
+    ("rem_sleep_duration", "contributors.rem_sleep"),
+    ("light_sleep_duration", "contributors.timing"),
+    ("deep_sleep_duration", "contributors.deep_sleep"),
+    ("average_hrv", "contributors.hrv_balance"),
+    ("temperature_deviation", "temperature_deviation"),
+    ("activity_burn", "active_calories"),
+]
+FLOAT_COLUMNS = {"sleep_efficiency", "average_hrv", "temperature_deviation"}
+INT_MAX = 2_000_000_000
+
+
+def read_watermark():
+    try:
+        with open(WATERMARK_FILE) as f:
+            return datetime.strptime(f.read().strip(), WATERMARK_FORMAT)
+    except (OSError, ValueError):
+        return None
+
+
+def write_watermark(timestamp):
+    os.makedirs(LOG_DIR, exist_ok=True)
+    with open(WATERMARK_FILE, "w") as f:
+        f.write(timestamp.strftime(WATERMARK_FORMAT))
+
+
+def sync_window(full=False, since=None):
+    end_date = datetime.now(UTC).date()
+    if since is not None:
+        start_date = since
+    else:
+        watermark = None if full else read_watermark()
+        if watermark is not None:
+            start_date = watermark.date() - timedelta(days=WATERMARK_OVERLAP_DAYS)
+        else:
+            start_date = end_date - timedelta(days=DEFAULT_LOOKBACK_DAYS)
+    return min(start_date, end_date), end_date
+
+
+def fetch_oura_data(start_date, end_date, token=None, client=None):
+    def get_df(docs):
+        df = pd.json_normalize(docs)
+        if df.empty:
+            return pd.DataFrame(columns=["day"])
         df['day'] = pd.to_datetime(df['day'])
         return df
 
-    activity = get_df("daily_activity")
-    sleep = get_df("daily_sleep")
-    readiness = get_df("daily_readiness")
+    # All endpoints and date windows are requested concurrently over one pooled session.
+    # Callers syncing several accounts pass their own (rate-limited) client.
+    with metrics.phase("fetch"):
+        if client is None:
+            with OuraClient(token or OURA_TOKEN) as client:
+                docs = client.fetch(ENDPOINTS, start_date, end_date)
+        else:
+            docs = client.fetch(ENDPOINTS, start_date, end_date)
+    metrics.sync_rows.inc(sum(len(endpoint_docs) for endpoint_docs in docs.values()), phase="fetch")
 
-    df = activity.merge(sleep, on="day", how="outer", suffixes=("", "_sleep"))
-    df = df.merge(readiness, on="day", how="outer", suffixes=("", "_readiness"))
+    with metrics.phase("normalize"):
+        activity = get_df(docs["daily_activity"])
+        sleep = get_df(docs["daily_sleep"])
+        readiness = get_df(docs["daily_readiness"])
 
-    def get_latest_oura_timestamp(df):
-        timestamps = []
-        for col in ['timestamp', 'timestamp_sleep', 'timestamp_readiness']:
-            if col in df.columns:
-                try:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-                    timestamps.append(df[col].max())
-                except Exception as e:
-                    print(f"⚠️ Failed to parse column {col}: {e}")
-        return max([t for t in timestamps if pd.notnull(t)], default=pd.NaT)
+    with metrics.phase("merge"):
+        df = activity.merge(sleep, on="day", how="outer", suffixes=("", "_sleep"))
+        df = df.merge(readiness, on="day", how="outer", suffixes=("", "_readiness"))
+    metrics.sync_rows.inc(len(df), phase="merge")
+    return df
 
-    latest_oura_timestamp = get_latest_oura_timestamp(df)
-    if pd.notnull(latest_oura_timestamp):
-        os.makedirs("../logs", exist_ok=True)
-        with open("../logs/last_oura_sync.txt", "w") as f:
-            f.write(latest_oura_timestamp.strftime("%Y-%m-%d %H:%M:%S"))
 
-    return df
+def fetch_heartrate(start_date, end_date, token=None, client=None):
+    # -> (timestamps datetime64[s] UTC, bpm uint8, source uint8)
+    if client is None:
+        with OuraClient(token or OURA_TOKEN) as client:
+            docs = client.fetch(["heartrate"], start_date, end_date)
+    else:
+        docs = client.fetch(["heartrate"], start_date, end_date)
+    return heartrate_store.samples_from_docs(docs["heartrate"])
+
+
+def sync_heartrate(start_date, end_date, token=None, client=None, account_id=DEFAULT_ACCOUNT):
+    # Returns (samples fetched, days written)
+    with metrics.phase("heartrate_fetch"):
+        ts, bpm, source = fetch_heartrate(start_date, end_date, token, client)
+    metrics.sync_rows.inc(len(ts), phase="heartrate_fetch")
+    if len(ts) == 0:
+        return 0, 0
+    ensure_schema()
+    with metrics.phase("heartrate_write"), db.connection("oura") as conn, conn.cursor() as cur:
+        days = heartrate_store.write_samples(cur, account_id, ts, bpm, source)
+    metrics.sync_rows.inc(days, phase="heartrate_write")
+    return len(ts), days
+
+
+def get_latest_oura_timestamp(df):
+    timestamps = []
+    for col in ['timestamp', 'timestamp_sleep', 'timestamp_readiness']:
+        if col in df.columns:
+            try:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+                timestamps.append(df[col].max())
+            except Exception as e:
+                print(f"⚠️ Failed to parse column {col}: {e}")
+    return max([t for t in timestamps if pd.notnull(t)], default=pd.NaT)
+
 
 def safe_int(value, max_val=2_000_000_000):
     try:
@@ -59,48 +156,144 @@ def safe_float(value):
     except:
         return None
 
-def sync_to_postgres(df):
-    conn = psycopg2.connect(
-        dbname="oura_data",
-        user="postgres",
-        password="password",
-        host="localhost",
-        port=5432
-    )
-    cur = conn.cursor()
-    cur.execute("DELETE FROM oura_trends")
-
-    for _, row in df.iterrows():
-        cur.execute("""
-            INSERT INTO oura_trends (
-                date, readiness_score, sleep_score, activity_score,
-                steps, sleep_efficiency, lowest_resting_heart_rate,
-                total_sleep_duration, rem_sleep_duration,
-                light_sleep_duration, deep_sleep_duration,
-                average_hrv, temperature_deviation, activity_burn
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            row.get('day'),
-            safe_int(row.get('score_readiness')),
-            safe_int(row.get('score_sleep')),
-            safe_int(row.get('score')),
-            safe_int(row.get('steps')),
-            safe_float(row.get('contributors.efficiency')),
-            safe_int(row.get('contributors.resting_heart_rate')),
-            safe_int(row.get('contributors.total_sleep')),
-            safe_int(row.get('contributors.rem_sleep')),
-            safe_int(row.get('contributors.timing')),
-            safe_int(row.get('contributors.deep_sleep')),
-            safe_float(row.get('contributors.hrv_balance')),
-            safe_float(row.get('temperature_deviation')),
-            safe_int(row.get('active_calories'))
-        ))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+
+def ensure_schema():
+    # oura_trends, its (account_id, date) key, updated_at and indexes; see backend/migrations.py.
+    # Runs before the write transaction opens and is a no-op after the first call.
+    return migrations.ensure_migrated()
+
+
+def upsert_sql(source=None):
+    columns = [col for col, _ in COLUMN_MAP]
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in columns)
+    current = ", ".join(f"oura_trends.{col}" for col in columns)
+    incoming = ", ".join(f"EXCLUDED.{col}" for col in columns)
+    if source is None:
+        rows = f"VALUES ({', '.join(['%s'] * (len(columns) + 2))})"
+    else:
+        # ON CONFLICT can't touch the same row twice in one statement, so keep one row per day
+        rows = (f"SELECT DISTINCT ON (account_id, date) account_id, date, {', '.join(columns)} "
+                f"FROM {source} ORDER BY account_id, date")
+    # The WHERE clause turns unchanged days into no-ops, so only changed rows get rewritten
+    return f"""
+        INSERT INTO oura_trends (account_id, date, {', '.join(columns)})
+        {rows}
+        ON CONFLICT (account_id, date) DO UPDATE SET {updates}, updated_at = now()
+        WHERE ({current}) IS DISTINCT FROM ({incoming})
+    """
+
+
+def build_rows_frame(df, strategies=None, account_id=DEFAULT_ACCOUNT):
+    # Vectorized equivalent of safe_int/safe_float over the whole merged frame.
+    # strategies optionally fills gaps (see oura_cleaning.impute) before writing.
+    day = df['day']
+    if pd.api.types.is_datetime64_any_dtype(day):
+        day = day.dt.date
+    rows = pd.DataFrame({"account_id": account_id, "date": day})
+    for col, source in COLUMN_MAP:
+        if source in df.columns:
+            values = pd.to_numeric(df[source], errors="coerce").astype("float64")
+        else:
+            values = pd.Series(np.nan, index=df.index)
+        values = values.replace([np.inf, -np.inf], np.nan)
+        if col in FLOAT_COLUMNS:
+            rows[col] = values
+        else:
+            rows[col] = np.trunc(values.clip(-INT_MAX, INT_MAX)).astype("Int64")
+    rows = rows[rows['date'].notna()]
+    if strategies:
+        rows = impute(rows.sort_values('date', ignore_index=True), strategies)
+        rows = rows.drop(columns=mask_columns(rows))
+        for col, _ in COLUMN_MAP:
+            if col not in FLOAT_COLUMNS:
+                rows[col] = rows[col].astype("Int64")
+    return rows
+
+
+def write_rows(cur, df, account_id=DEFAULT_ACCOUNT):
+    sql = upsert_sql()
+    changed = 0
+    for _, row in df[df['day'].notna()].iterrows():
+        values = [account_id, row.get('day')]
+        for col, source in COLUMN_MAP:
+            convert = safe_float if col in FLOAT_COLUMNS else safe_int
+            values.append(convert(row.get(source)))
+        cur.execute(sql, values)
+        changed += cur.rowcount
+    return changed
+
+
+def write_bulk(cur, df, strategies=None, account_id=DEFAULT_ACCOUNT):
+    rows = build_rows_frame(df, strategies, account_id)
+    columns = list(rows.columns)
+    cur.execute(f"""
+        CREATE TEMP TABLE oura_trends_stage ON COMMIT DROP AS
+        SELECT {', '.join(columns)} FROM oura_trends WITH NO DATA
+    """)
+    db.copy_frame(cur, rows, "oura_trends_stage")
+
+    cur.execute(upsert_sql(source="oura_trends_stage"))
+    return cur.rowcount
+
+
+def sync_to_postgres(df, bulk=True, strategies=None, account_id=DEFAULT_ACCOUNT):
+    # Everything below runs in one transaction, so readers never see a half-written sync
+    ensure_schema()
+    with db.connection("oura") as conn, conn.cursor() as cur:
+        with metrics.phase("write"):
+            if bulk:
+                changed = write_bulk(cur, df, strategies, account_id)
+            else:
+                changed = write_rows(cur, df, account_id)
+        metrics.sync_rows.inc(changed, phase="write")
+        # Rebuild only this account's weeks/months covering the fetched days
+        if changed and not df.empty:
+            with metrics.phase("rollups"):
+                oura_rollups.update(cur, df['day'].min(), df['day'].max(), account_id)
+        return changed
+
+
+def run_sync(full=False, since=None, progress=None, strategies=None, heartrate=SYNC_HEARTRATE):
+    # progress(phase, fraction, message) lets callers such as the dashboard's
+    # background sync job report where the run is
+    report = progress or (lambda phase, fraction, message="": None)
+
+    start_date, end_date = sync_window(full=full, since=since)
+    print(f"🔄 Fetching Oura data from {start_date} to {end_date}")
+    report("fetch", 0.1, f"Fetching {start_date} to {end_date}")
+    df = fetch_oura_data(start_date, end_date)
+
+    report("write", 0.6, f"Writing {len(df)} days")
+    changed = sync_to_postgres(df, strategies=strategies)
+
+    # Only advance the watermark once the rows are committed
+    latest_oura_timestamp = get_latest_oura_timestamp(df)
+    if pd.notnull(latest_oura_timestamp):
+        write_watermark(latest_oura_timestamp)
+    report("write", 0.8, f"{changed} changed days")
+
+    # Intraday samples are best effort: a failure here must not undo the daily sync
+    if heartrate:
+        report("heartrate", 0.85, f"Fetching heart rate {start_date} to {end_date}")
+        try:
+            samples, days = sync_heartrate(start_date, end_date)
+            print(f"💓 {samples} heart rate samples, {days} changed days")
+        except Exception as e:
+            print(f"⚠️ Failed to sync heart rate: {e}")
+    return changed
+
 
 if __name__ == "__main__":
-    df = fetch_oura_data()
-    sync_to_postgres(df)
-    print("✅ Live Oura data synced successfully.")
+    parser = argparse.ArgumentParser(description="Sync Oura API data into the oura_trends table")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and re-fetch the default window")
+    parser.add_argument("--since", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date(),
+                        help="fetch everything from this date (YYYY-MM-DD)")
+    parser.add_argument("--impute", action="store_true",
+                        help="fill gaps with oura_cleaning.DEFAULT_STRATEGIES before writing")
+    parser.add_argument("--no-heartrate", action="store_true", help="skip the intraday heart rate samples")
+    args = parser.parse_args()
+
+    strategies = DEFAULT_STRATEGIES if args.impute else None
+    changed = run_sync(full=args.full, since=args.since, strategies=strategies,
+                       heartrate=SYNC_HEARTRATE and not args.no_heartrate)
+    print(f"✅ Live Oura data synced successfully ({changed} changed days).")
@@ -1,94 +1,57 @@
-import psycopg2
-import csv
+import os
+import sys
+import time
 
-# Step 1: Clean the CSV by replacing "None" with empty string
-input_file = '../data/oura_trends.csv'
-clean_file = '../data/oura_trends_cleaned.csv'
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import db
+import oura_rollups
+from csv_stream import CleanedCSVStream
+from sync_oura_api_to_postgres import ensure_schema
 
-with open(input_file, 'r', encoding='utf-8') as infile, open(clean_file, 'w', newline='', encoding='utf-8') as outfile:
-    reader = csv.reader(infile)
-    writer = csv.writer(outfile)
-    for row in reader:
-        cleaned_row = ["" if cell == "None" else cell for cell in row]
-        writer.writerow(cleaned_row)
+# Step 1: Source export. Cells are cleaned ("None" -> empty) while streaming into
+# COPY in Step 4, so no cleaned copy is written to disk
+input_file = sys.argv[1] if len(sys.argv) > 1 else '../data/oura_trends.csv'
 
-# Step 2: Connect to PostgreSQL
-conn = psycopg2.connect(
-    dbname="oura_data",
-    user="postgres",
-    password="password",  # 🔁 Replace with your actual password
-    host="localhost",
-    port=5432
-)
-cur = conn.cursor()
+# Step 2: Create or upgrade the table (key on (account_id, date), indexes, ...)
+# through the versioned migrations in backend/migrations.py, in their own transaction
+ensure_schema()
 
-# Step 3: Re-create the table (optional if already done)
-cur.execute("""
-CREATE TABLE IF NOT EXISTS oura_trends (
-    date DATE,
-    restfulness_score INT,
-    deep_sleep_score INT,
-    readiness_score INT,
-    resting_heart_rate_score INT,
-    sleep_latency_score INT,
-    low_activity_time INT,
-    lowest_resting_heart_rate INT,
-    medium_activity_time INT,
-    temperature_trend_deviation TEXT,
-    activity_balance_score INT,
-    training_volume_score INT,
-    sleep_latency INT,
-    sleep_timing INT,
-    average_hrv FLOAT,
-    high_activity_time INT,
-    sleep_balance_score INT,
-    restless_sleep FLOAT,
-    average_resting_heart_rate FLOAT,
-    rest_time INT,
-    long_periods_of_inactivity INT,
-    hrv_balance_score INT,
-    total_sleep_duration INT,
-    sleep_efficiency_score INT,
-    sleep_timin_score INT,
-    inactive_time INT,
-    previous_night_score INT,
-    recovery_index_score INT,
-    meet_daily_targets_score INT,
-    total_sleep_score INT,
-    sleep_score INT,
-    temperature_deviation FLOAT,
-    equivalent_walking_distance FLOAT,
-    bedtime_start TEXT,
-    bedtime_end TEXT,
-    sleep_efficiency FLOAT,
-    non_wear_time INT,
-    stay_active_score INT,
-    steps INT,
-    activity_score INT,
-    awake_time INT,
-    rem_sleep_duration INT,
-    rem_sleep_score INT,
-    respiratory_rate FLOAT,
-    deep_sleep_duration INT,
-    light_sleep_duration INT,
-    move_every_hour_score INT,
-    activity_burn INT,
-    average_met FLOAT,
-    temperature_score INT,
-    training_frequency_score INT,
-    total_bedtime FLOAT,
-    total_burn INT,
-    previous_day_activity_score INT
-);
-""")
-conn.commit()
+# Step 3: Connect to PostgreSQL (settings from OURA_DB_* env vars)
+with db.connection("oura") as conn:
+    cur = conn.cursor()
 
-# Step 4: Load cleaned CSV into the DB
-with open(clean_file, 'r', encoding='utf-8') as f:
-    cur.copy_expert("COPY oura_trends FROM STDIN WITH CSV HEADER", f)
+    # Step 4: Stream the cleaned rows into a staging table, then upsert them on the
+    # (account_id, date) key so re-uploading an export updates rows instead of failing.
+    # Columns are listed from the header so the rest (updated_at, account_id) keep their defaults
+    started = time.perf_counter()
+    with CleanedCSVStream(input_file) as stream:
+        columns = stream.header
+        cur.execute(f"""
+            CREATE TEMP TABLE oura_trends_upload ON COMMIT DROP AS
+            SELECT {', '.join(columns)} FROM oura_trends WITH NO DATA
+        """)
+        cur.copy_expert(f"COPY oura_trends_upload ({', '.join(columns)}) FROM STDIN WITH CSV", stream)
+        stream.report()
+    key = [col for col in ("account_id", "date") if col in columns]
+    values = [col for col in columns if col not in key + ["updated_at"]]
+    updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in values)
+    current = ", ".join(f"oura_trends.{col}" for col in values)
+    incoming = ", ".join(f"EXCLUDED.{col}" for col in values)
+    # As in the sync's upsert_sql, unchanged days are no-ops, so re-uploading an
+    # export doesn't bump updated_at and force the dashboards to reload every row
+    cur.execute(f"""
+        INSERT INTO oura_trends ({', '.join(columns)})
+        SELECT DISTINCT ON ({', '.join(key)}) {', '.join(columns)} FROM oura_trends_upload
+        WHERE date IS NOT NULL
+        ORDER BY {', '.join(key)}
+        ON CONFLICT (account_id, date) DO UPDATE SET {updates}, updated_at = now()
+        WHERE ({current}) IS DISTINCT FROM ({incoming})
+    """)
+    print(f"📦 Loaded {stream.rows:,} rows ({cur.rowcount:,} upserted) in {time.perf_counter() - started:.1f}s")
 
-conn.commit()
-cur.close()
-conn.close()
+    # Rebuild the weekly/monthly rollups from the loaded days
+    oura_rollups.update(cur)
+
+    cur.close()
 
 print("✅ Cleaned CSV uploaded successfully to oura_data DB!")
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oura_dashboard"))
+from data_store import REFRESH_OVERLAP, DataStore
+
+SYNCED = pd.Timestamp("2024-03-01 12:00", tz="UTC")
+
+
+class FakeTable:
+    # Answers the handful of statements DataStore sends, from an in-memory frame
+    def __init__(self, days=5):
+        self.rows = pd.DataFrame({
+            "date": pd.date_range("2024-01-01", periods=days),
+            "updated_at": [SYNCED] * days,
+            "steps": [1000.0 * (i + 1) for i in range(days)],
+        })
+
+    def query(self, sql, params=None):
+        if "information_schema" in sql:
+            return pd.DataFrame({"column_name": list(self.rows.columns)})
+        if "count(*)" in sql:
+            return pd.DataFrame({"n": [len(self.rows)]})
+        if sql.startswith("SELECT date FROM"):
+            return self.rows[["date"]].copy()
+        if "updated_at >" in sql:
+            return self.rows[self.rows["updated_at"] > params[0]].reset_index(drop=True)
+        return self.rows.copy()
+
+    def update(self, day, steps, updated_at):
+        row = self.rows["date"] == pd.Timestamp(day)
+        self.rows.loc[row, "steps"] = steps
+        self.rows.loc[row, "updated_at"] = updated_at
+
+
+def loaded_store(table):
+    store = DataStore(table.query, columns=["steps"], time_ranges={"all": None})
+    store.load()
+    return store
+
+
+def test_refresh_without_changes_keeps_the_snapshot():
+    table = FakeTable()
+    store = loaded_store(table)
+    snapshot = store.snapshot
+    assert store.refresh() is snapshot
+
+
+def test_refresh_merges_updated_and_new_rows():
+    table = FakeTable()
+    store = loaded_store(table)
+    table.update("2024-01-02", 9999.0, SYNCED + pd.Timedelta(hours=1))
+    table.rows = pd.concat([table.rows, pd.DataFrame({
+        "date": [pd.Timestamp("2024-01-06")], "updated_at": [SYNCED + pd.Timedelta(hours=1)], "steps": [6000.0],
+    })], ignore_index=True)
+
+    snapshot = store.refresh()
+    assert snapshot.raw["steps"].tolist() == [1000, 9999, 3000, 4000, 5000, 6000]
+    assert snapshot.df["date"].is_monotonic_increasing
+    assert snapshot.version == 2
+
+
+def test_refresh_picks_up_late_commits_below_the_watermark():
+    table = FakeTable()
+    store = loaded_store(table)
+    before = store.data_version
+    # Committed after the last refresh, but its now() predates the watermark
+    table.update("2024-01-03", 3333.0, SYNCED - REFRESH_OVERLAP / 2)
+
+    snapshot = store.refresh()
+    assert snapshot.raw["steps"].tolist() == [1000, 2000, 3333, 4000, 5000]
+    assert store.data_version != before
+
+
+def test_refresh_drops_deleted_rows():
+    table = FakeTable()
+    store = loaded_store(table)
+    table.rows = table.rows[table.rows["date"] != pd.Timestamp("2024-01-04")].reset_index(drop=True)
+
+    snapshot = store.refresh()
+    assert snapshot.raw["date"].dt.day.tolist() == [1, 2, 3, 5]
+    assert snapshot.day("2024-01-04") is None
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oura_dashboard"))
+from downsample import decimate, lttb_indices, minmax_indices
+
+
+def spiky_series(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=float)
+    y = rng.normal(0, 1, n)
+    y[n // 4], y[2 * n // 3] = 50.0, -50.0
+    return x, y
+
+
+def test_lttb_keeps_first_last_and_peaks():
+    x, y = spiky_series()
+    keep = lttb_indices(x, y, 200)
+    assert len(keep) == 200
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert 1250 in keep and 3333 in keep
+
+
+def test_minmax_keeps_first_last_and_extremes():
+    _, y = spiky_series()
+    keep = minmax_indices(y, 200)
+    assert len(keep) <= 200
+    assert keep[0] == 0 and keep[-1] == len(y) - 1
+    assert 1250 in keep and 3333 in keep
+
+
+def test_small_inputs_are_returned_whole():
+    x, y = spiky_series(n=50)
+    assert np.array_equal(lttb_indices(x, y, 100), np.arange(50))
+    assert np.array_equal(minmax_indices(y, 100), np.arange(50))
+
+
+def test_decimate_skips_missing_values_and_handles_dates():
+    dates = pd.date_range("2020-01-01", periods=3000)
+    values = pd.array(np.arange(3000) % 97, dtype="Int32")
+    values[::10] = pd.NA
+    values[2222] = 1000
+    for method in ("lttb", "minmax"):
+        keep = decimate(dates, values, 300, method=method)
+        assert len(keep) <= 300
+        assert not pd.isna(values[keep]).any()
+        assert 2222 in keep
+        assert keep[0] == 1 and keep[-1] == 2999
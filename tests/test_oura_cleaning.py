@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from oura_cleaning import impute, mask_columns
+
+
+def days_with_gap():
+    # Three days, a two-week gap, then three more; step counts are far apart
+    dates = pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03",
+                            "2024-01-20", "2024-01-21", "2024-01-22"])
+    return pd.DataFrame({
+        "date": dates,
+        "steps": [100.0, 200.0, 300.0, np.nan, 5000.0, 6000.0],
+        "activity_score": [70.0, np.nan, 80.0, np.nan, 90.0, 95.0],
+    })
+
+
+def test_rolling_median_uses_calendar_days():
+    out = impute(days_with_gap())
+    # Only 2024-01-21/22 fall within 3 days of the 20th; a 7-row window would
+    # also have pulled in the early-January values
+    assert out.loc[3, "steps"] == 5500
+    assert out["steps_imputed"].tolist() == [False, False, False, True, False, False]
+
+
+def test_ffill_and_masks():
+    out = impute(days_with_gap())
+    assert out["activity_score"].tolist() == [70, 70, 80, 80, 90, 95]
+    assert out["activity_score_imputed"].tolist() == [False, True, False, True, False, False]
+    assert sorted(mask_columns(out)) == ["activity_score_imputed", "steps_imputed"]
+
+
+def test_impute_is_deterministic_and_leaves_input_alone():
+    df = days_with_gap()
+    before = df.copy()
+    first, second = impute(df), impute(df)
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_without_dates_falls_back_to_rows():
+    out = impute(days_with_gap().drop(columns="date"))
+    assert out.loc[3, "steps"] == 300